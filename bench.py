@@ -0,0 +1,365 @@
+"""Benchmarks for the generation and export paths.
+
+Run ``python bench.py`` to print the results as JSON and save them (with a
+timestamp) to ``--output`` so runs can be compared for regressions. The
+end-to-end numbers run generate_posts_async() against mock_server.py, so no
+GPU endpoints are needed.
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import UTC
+
+from generate_posts import (
+    POST_COLUMNS,
+    build_records,
+    explode_posts,
+    format_data_set,
+    generate_system_prompt,
+    responses_table,
+    sample_account,
+)
+from store import open_store
+
+WORDS = [
+    "the",
+    "a",
+    "to",
+    "and",
+    "of",
+    "my",
+    "just",
+    "so",
+    "this",
+    "is",
+    "why",
+    "we",
+    "you",
+    "lol",
+    "omg",
+    "new",
+    "deal",
+    "today",
+]
+
+
+def synthetic_responses(n: int, posts_per_response: int = 28, seed: int = 0) -> list:
+    """Raw records shaped like posts.db rows, with realistic post text."""
+    random.seed(seed)
+    responses = []
+    for i in range(n):
+        posts = []
+        for _ in range(posts_per_response):
+            posts.append(" ".join(random.choices(WORDS, k=random.randint(5, 50))))
+            if random.random() < 0.05:
+                posts.append("---")
+        responses.append(
+            {
+                "model": "bench",
+                "id": str(i),
+                "posts": "Here are some posts:\n\n" + "\n\n".join(posts) + "\n",
+                "account": sample_account(),
+            }
+        )
+    return responses
+
+
+def bench_split(n_responses: int = 20_000) -> dict:
+    """Python record loop vs Arrow compute explode over the same responses."""
+    import pandas as pd
+
+    responses = synthetic_responses(n_responses)
+
+    t = time.perf_counter()
+    records = build_records(responses)
+    python_df = pd.DataFrame(records)
+    python_seconds = time.perf_counter() - t
+
+    t = time.perf_counter()
+    arrow_df = explode_posts(responses_table(responses)).to_pandas()
+    arrow_seconds = time.perf_counter() - t
+
+    # Column order differs (the Arrow path has a fixed schema), values must not
+    expected = python_df.reindex(columns=POST_COLUMNS)
+    identical = expected.equals(arrow_df)
+    return {
+        "responses": n_responses,
+        "posts": len(records),
+        "python_seconds": round(python_seconds, 4),
+        "arrow_seconds": round(arrow_seconds, 4),
+        "speedup": round(python_seconds / arrow_seconds, 2),
+        "identical": identical,
+    }
+
+
+def write_synthetic_db(path: str, n_responses: int) -> list:
+    responses = synthetic_responses(n_responses)
+    db = open_store(path)
+    db.update((r["id"], r) for r in responses)
+    db.commit()
+    db.close()
+    return responses
+
+
+def bench_parquet_encoding(n_responses: int = 8037) -> dict:
+    """File size and load time of the export, plain strings vs categoricals.
+
+    The default size matches the published dataset (~8k users, ~229k posts).
+    """
+    import pandas as pd
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "posts.db")
+        write_synthetic_db(db_path, n_responses)
+        variants = {
+            "plain_snappy": {"categorical": False, "compression": "snappy"},
+            "categorical_snappy": {"categorical": True, "compression": "snappy"},
+            "categorical_zstd": {"categorical": True, "compression": "zstd"},
+        }
+        for name, options in variants.items():
+            output_path = os.path.join(tmp, f"{name}.parquet")
+            format_data_set(
+                streaming=True, db_path=db_path, output_path=output_path, **options
+            )
+            t = time.perf_counter()
+            df = pd.read_parquet(output_path)
+            load_seconds = time.perf_counter() - t
+            t = time.perf_counter()
+            df.groupby(["account_type", "model"], observed=True).size()
+            groupby_seconds = time.perf_counter() - t
+            results[name] = {
+                "posts": len(df),
+                "file_mb": round(os.path.getsize(output_path) / 1e6, 2),
+                "load_seconds": round(load_seconds, 4),
+                "memory_mb": round(df.memory_usage(deep=True).sum() / 1e6, 1),
+                "groupby_seconds": round(groupby_seconds, 4),
+            }
+    return results
+
+
+def bench_prompt_prefix(n_accounts: int = 2000) -> dict:
+    """Share of each prompt a prefix cache could reuse, per prompt layout.
+
+    For every prompt, the longest prefix it shares with any earlier prompt
+    (in characters) is what an ideal prefix cache would skip prefilling.
+    """
+    import os.path
+
+    random.seed(0)
+    accounts = [sample_account() for _ in range(n_accounts)]
+    results = {}
+    for layout in ("classic", "prefix_cached"):
+        prompts = [generate_system_prompt(a, layout) for a in accounts]
+        reused = total = 0
+        seen = []
+        for prompt in prompts:
+            # The last 50 prompts stand in for what the server still has cached
+            best = 0
+            for other in seen[-50:]:
+                best = max(best, len(os.path.commonprefix([prompt, other])))
+            reused += best
+            total += len(prompt)
+            seen.append(prompt)
+        t = time.perf_counter()
+        for a in accounts:
+            generate_system_prompt(a, layout)
+        results[layout] = {
+            "cacheable_fraction": round(reused / total, 3),
+            "microseconds_per_prompt": round(
+                (time.perf_counter() - t) / n_accounts * 1e6, 2
+            ),
+        }
+    return results
+
+
+def bench_db_writes(n_records: int = 20_000, batch_size: int = 256) -> dict:
+    """Records/sec through PostWriter into a fresh posts.db."""
+    from store import PostWriter
+
+    responses = synthetic_responses(n_records, posts_per_response=4)
+    with tempfile.TemporaryDirectory() as tmp:
+        t = time.perf_counter()
+        with PostWriter(os.path.join(tmp, "posts.db"), batch_size=batch_size) as w:
+            for record in responses:
+                w.write(record)
+        seconds = time.perf_counter() - t
+    return {
+        "records": n_records,
+        "seconds": round(seconds, 4),
+        "records_per_second": round(n_records / seconds, 1),
+    }
+
+
+def bench_end_to_end(
+    concurrency: tuple = (1, 8, 32, 128),
+    requests_per_level: int | None = None,
+    stream: bool = False,
+    mock=None,
+    output_format: str = "text",
+    samples_per_request: int = 1,
+    prefix_batch: int | None = None,
+) -> dict:
+    """generate_posts_async() against the mock server, then the export.
+
+    For each concurrency level: requests/sec, responses/sec, posts/sec,
+    completion tokens/sec, p50/p99 request latency, and the streaming export
+    time for the resulting DB. ``requests_per_level`` defaults to 8 per
+    in-flight slot.
+
+    ``samples_per_request`` and ``prefix_batch`` (a batch_by_prefix() batch
+    size) run the two prefill-sharing modes. The mock's time to first token
+    doesn't depend on the prompt, so this measures what they save in
+    per-request overhead, not in prefill.
+    """
+    import asyncio
+    import contextlib
+    import io
+
+    from catalog import sample_accounts
+    from generate_posts import generate_posts_async, new_job
+    from mock_server import MockConfig, MockServer
+    from scheduler import batch_by_prefix
+
+    results = {}
+    with MockServer(mock or MockConfig(seed=0)) as server:
+        for level in concurrency:
+            n = requests_per_level or max(8 * level, 32)
+            server.stats.reset()
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = os.path.join(tmp, "posts.db")
+                jobs = None
+                if prefix_batch:
+                    accounts = sample_accounts(n, seed=level)
+                    jobs = batch_by_prefix(
+                        [new_job(account) for account in accounts],
+                        prefix_batch,
+                        server.configs(),
+                    )
+                t = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    metrics = asyncio.run(
+                        generate_posts_async(
+                            max_in_flight=level,
+                            per_endpoint_limit=level,
+                            num_requests=n,
+                            configs=server.configs(),
+                            db_path=db_path,
+                            report_every=0,
+                            stream=stream,
+                            output_format=output_format,
+                            samples_per_request=samples_per_request,
+                            jobs=jobs,
+                        )
+                    )
+                seconds = time.perf_counter() - t
+
+                t = time.perf_counter()
+                format_data_set(
+                    streaming=True,
+                    db_path=db_path,
+                    output_path=os.path.join(tmp, "posts.parquet"),
+                )
+                export_seconds = time.perf_counter() - t
+
+            (summary,) = metrics.summary().values()
+            results[str(level)] = {
+                "requests": n,
+                "errors": summary["errors"],
+                "seconds": round(seconds, 3),
+                "requests_per_second": round(n / seconds, 2),
+                "responses_per_second": round(n * samples_per_request / seconds, 2),
+                "posts_per_second": round(summary["posts"] / seconds, 1),
+                "tokens_per_second": round(summary["completion_tokens"] / seconds, 1),
+                "p50_latency": round(summary["p50_latency"], 4),
+                "p99_latency": round(summary["p99_latency"], 4),
+                "export_seconds": round(export_seconds, 4),
+            }
+    return results
+
+
+def bench_import_time(
+    modules: tuple = ("cli", "generate_posts", "store", "workers"),
+    repeat: int = 5,
+) -> dict:
+    """Best-of-``repeat`` time to import each module in a fresh interpreter,
+    and which heavy dependencies the import dragged in (should be none)."""
+    import subprocess
+    import sys
+
+    heavy = ("pandas", "pyarrow", "numpy", "openai", "sqlitedict")
+    results = {}
+    for module in modules:
+        code = (
+            "import json, sys, time\n"
+            "t = time.perf_counter()\n"
+            f"import {module}\n"
+            "seconds = time.perf_counter() - t\n"
+            f"print(json.dumps([seconds, [m for m in {heavy!r} if m in sys.modules]]))"
+        )
+        runs = [
+            json.loads(
+                subprocess.run(
+                    [sys.executable, "-c", code],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                ).stdout
+            )
+            for _ in range(repeat)
+        ]
+        results[module] = {
+            "seconds": round(min(seconds for seconds, _ in runs), 4),
+            "heavy_imports": runs[0][1],
+        }
+    return results
+
+
+def main(argv: list | None = None):
+    import argparse
+    import platform
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--output-format", default="text")
+    parser.add_argument("--samples-per-request", type=int, default=4)
+    parser.add_argument("--prefix-batch", type=int, default=8)
+    args = parser.parse_args(argv)
+    end_to_end = {
+        "concurrency": tuple(args.concurrency),
+        "stream": args.stream,
+        "output_format": args.output_format,
+    }
+
+    results = {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "import_time": bench_import_time(),
+        "split": bench_split(),
+        "parquet_encoding": bench_parquet_encoding(),
+        "prompt_prefix": bench_prompt_prefix(),
+        "db_writes": bench_db_writes(),
+        "end_to_end": bench_end_to_end(**end_to_end),
+        "end_to_end_prefix_batches": bench_end_to_end(
+            **end_to_end, prefix_batch=args.prefix_batch
+        ),
+    }
+    if not args.stream:
+        # n > 1 can't be streamed
+        results["end_to_end_samples"] = bench_end_to_end(
+            **end_to_end, samples_per_request=args.samples_per_request
+        )
+    print(json.dumps(results, indent=2))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""ACCOUNT_DATA compiled into integer-coded NumPy arrays for bulk sampling.
+
+``sample_account()`` makes several ``random.choice`` calls and dict lookups
+per account. ``sample_accounts(n, seed=...)`` draws ``n`` accounts in a
+handful of vectorised calls instead: account types through an alias table
+over the weights, personas uniformly within their type, and each modifier
+uniformly over the options the persona allows (its persona_mappings entry
+if it has one, otherwise every option). The same seed always gives the same
+accounts.
+
+``Catalog`` is the compiled form: validated once, frozen, and the source of
+the integer ids used for sampling, prompt building and the Parquet export.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from generate_posts import (
+    ACCOUNT_DATA,
+    _prompt_template,
+    readable,
+    validate_account_data,
+)
+
+
+def alias_table(weights) -> tuple:
+    """Vose's alias method: (prob, alias) arrays for O(1) weighted draws."""
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(weights)
+    scaled = weights * n / weights.sum()
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1.0]
+    large = [i for i in range(n) if scaled[i] >= 1.0]
+    while small and large:
+        s, g = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = g
+        scaled[g] -= 1.0 - scaled[s]
+        (small if scaled[g] < 1.0 else large).append(g)
+    return prob, alias
+
+
+class Catalog:
+    """Frozen, integer-coded view of a validated ACCOUNT_DATA.
+
+    Codes index into ``account_types``, ``personas`` (global, grouped by
+    type) and ``values`` (every modifier option); ``categories`` is every
+    modifier category in ``account_data`` order (MODIFIER_COLUMNS for
+    ACCOUNT_DATA itself). For persona p and category c the allowed value codes
+    are ``choices[offsets[p, c] : offsets[p, c] + counts[p, c]]``; a count
+    of 0 means the category doesn't apply to p's account type.
+
+    The Parquet export uses the account type and persona codes as its
+    dictionary indices, and for each modifier column codes into
+    ``category_values[c]`` (only the options of that category), so a
+    column's dictionary is its lookup table (see labels()).
+    """
+
+    __slots__ = (
+        "_frozen",
+        "account_types",
+        "categories",
+        "category_values",
+        "choices",
+        "counts",
+        "offsets",
+        "persona_type",
+        "personas",
+        "readable_categories",
+        "readable_values",
+        "type_alias",
+        "type_counts",
+        "type_offsets",
+        "type_prob",
+        "values",
+    )
+
+    def __init__(self, account_data: dict = ACCOUNT_DATA):
+        validate_account_data(account_data)
+        categories = list(
+            dict.fromkeys(
+                category
+                for data in account_data.values()
+                for category in data.get("modifiers", {})
+            )
+        )
+        category_codes = {c: i for i, c in enumerate(categories)}
+        personas, persona_type, values = [], [], []
+        value_codes = {}
+        type_offsets, type_counts = [], []
+        offsets, counts, choices = [], [], []
+        category_values = {category: {} for category in categories}
+
+        def code(value):
+            if value not in value_codes:
+                value_codes[value] = len(values)
+                values.append(value)
+            return value_codes[value]
+
+        for t, data in enumerate(account_data.values()):
+            modifiers = data.get("modifiers", {})
+            for category, options in modifiers.items():
+                for value in options:
+                    code(value)
+                    category_values[category].setdefault(value, None)
+            type_offsets.append(len(personas))
+            type_counts.append(len(data["personas"]))
+            mappings = data.get("persona_mappings", {})
+            for persona in data["personas"]:
+                personas.append(persona)
+                persona_type.append(t)
+                row_offsets = [0] * len(categories)
+                row_counts = [0] * len(categories)
+                mapping = mappings.get(persona, {})
+                for category, options in modifiers.items():
+                    allowed = mapping.get(category, options)
+                    if not isinstance(allowed, list):
+                        allowed = [allowed]
+                    c = category_codes[category]
+                    row_offsets[c] = len(choices)
+                    row_counts[c] = len(allowed)
+                    choices.extend(code(value) for value in allowed)
+                offsets.append(row_offsets)
+                counts.append(row_counts)
+
+        self.account_types = tuple(account_data)
+        self.personas = tuple(personas)
+        self.categories = tuple(categories)
+        self.values = tuple(values)
+        self.readable_categories = tuple(readable(c) for c in categories)
+        self.readable_values = tuple(readable(v) for v in values)
+        self.category_values = tuple(tuple(category_values[c]) for c in categories)
+        self.type_prob, self.type_alias = alias_table(
+            [data["weight"] for data in account_data.values()]
+        )
+        self.persona_type = np.array(persona_type)
+        self.type_offsets = np.array(type_offsets)
+        self.type_counts = np.array(type_counts)
+        self.offsets = np.array(offsets)
+        self.counts = np.array(counts)
+        self.choices = np.array(choices)
+        for name in self.__slots__:
+            value = getattr(self, name, None)
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("Catalog is frozen")
+        object.__setattr__(self, name, value)
+
+    def persona_code(self, account_type: str, persona: str) -> int:
+        """Code of a persona; names are only unique within their account type."""
+        t = self.account_types.index(account_type)
+        start = int(self.type_offsets[t])
+        return self.personas.index(persona, start, start + int(self.type_counts[t]))
+
+    def labels(self, column: str) -> tuple:
+        """The code -> name table behind a Parquet column."""
+        if column == "account_type":
+            return self.account_types
+        if column == "persona":
+            return self.personas
+        if column in self.categories:
+            return self.category_values[self.categories.index(column)]
+        raise KeyError(column)
+
+
+@dataclass
+class AccountBatch:
+    """``n`` sampled accounts as code arrays; ``modifiers`` is -1 where a
+    category doesn't apply."""
+
+    catalog: Catalog
+    account_type: np.ndarray  # (n,)
+    persona: np.ndarray  # (n,)
+    modifiers: np.ndarray  # (n, len(categories))
+
+    def __len__(self) -> int:
+        return len(self.persona)
+
+    def account(self, i: int) -> dict:
+        """Account i in the same shape sample_account() returns."""
+        c = self.catalog
+        return {
+            "account_type": c.account_types[self.account_type[i]],
+            "persona": c.personas[self.persona[i]],
+            "modifiers": {
+                c.categories[j]: c.values[v]
+                for j, v in enumerate(self.modifiers[i])
+                if v >= 0
+            },
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.account(i)
+
+    def system_prompt(
+        self, i: int, layout: str = "classic", output_format: str = "text"
+    ) -> str:
+        """generate_system_prompt(self.account(i)), built straight from codes."""
+        c = self.catalog
+        head, tail = _prompt_template(
+            c.account_types[self.account_type[i]],
+            c.personas[self.persona[i]],
+            layout,
+            output_format,
+        )
+        lines = [
+            f"- {c.readable_categories[j]}: {c.readable_values[v]}"
+            for j, v in enumerate(self.modifiers[i].tolist())
+            if v >= 0
+        ]
+        modifier_text = (
+            "CHARACTERISTICS:\n" + "\n".join(lines)
+            if lines
+            else "No specific characteristics defined."
+        )
+        return head + modifier_text + tail
+
+
+_CATALOG = None
+
+
+def get_catalog() -> Catalog:
+    """The Catalog for ACCOUNT_DATA, compiled on first use."""
+    global _CATALOG
+    if _CATALOG is None:
+        _CATALOG = Catalog()
+    return _CATALOG
+
+
+def sample_accounts(n: int, seed: int | None = None) -> AccountBatch:
+    """Draw n accounts in one vectorised pass; same seed, same accounts."""
+    c = get_catalog()
+    rng = np.random.default_rng(seed)
+
+    # Alias draw for the account type
+    slot = rng.integers(0, len(c.type_prob), size=n)
+    keep = rng.random(n) < c.type_prob[slot]
+    account_type = np.where(keep, slot, c.type_alias[slot])
+
+    # Uniform persona within the type
+    counts = c.type_counts[account_type]
+    persona = c.type_offsets[account_type] + (rng.random(n) * counts).astype(np.int64)
+
+    return AccountBatch(c, account_type, persona, _sample_modifiers(c, persona, rng))
+
+
+def accounts_for(cells: list, seed: int | None = None) -> AccountBatch:
+    """One account per (account_type, persona) in ``cells``, modifiers drawn
+    as sample_accounts() draws them; same seed, same accounts."""
+    c = get_catalog()
+    rng = np.random.default_rng(seed)
+    persona = np.array(
+        [c.persona_code(account_type, name) for account_type, name in cells],
+        dtype=np.int64,
+    )
+    account_type = c.persona_type[persona]
+    return AccountBatch(c, account_type, persona, _sample_modifiers(c, persona, rng))
+
+
+def _sample_modifiers(c: Catalog, persona: np.ndarray, rng) -> np.ndarray:
+    """Uniform option among those the persona allows, per category."""
+    option_counts = c.counts[persona]
+    picks = (rng.random(option_counts.shape) * option_counts).astype(np.int64)
+    index = np.minimum(c.offsets[persona] + picks, len(c.choices) - 1)
+    return np.where(option_counts > 0, c.choices[index], -1)
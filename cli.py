@@ -0,0 +1,231 @@
+"""Command-line entry point: ``social-posts generate|export|stats|bench``.
+
+Each subcommand imports only what it needs, so ``--help`` and ``stats`` on
+posts.db never load pandas, pyarrow or openai (a ``.segments`` store is
+Arrow, so reading one needs pyarrow), and worker processes that import
+generate_posts start quickly.
+
+    social-posts generate --num-requests 1000 --max-in-flight 64 --stream
+    social-posts export --streaming --partition-by account_type model
+    social-posts stats --db posts.db
+    social-posts bench --concurrency 1 32
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+
+def db_stats(db_path: str = "posts.db") -> dict:
+    """Response, post and failure counts for posts.db or a segment store."""
+    from generate_posts import record_posts
+    from store import is_segment_store, open_reader
+
+    responses, posts = Counter(), Counter()
+    by_type = Counter()
+    failures = 0
+    db = open_reader(db_path)
+    try:
+        for record in db.values():
+            n = len(record_posts(record["posts"]))
+            responses[record["model"]] += 1
+            posts[record["model"]] += n
+            by_type[record["account"]["account_type"]] += n
+        if is_segment_store(db_path):
+            path = os.path.join(db_path, "failures.jsonl")
+            if os.path.exists(path):
+                with open(path) as f:
+                    failures = sum(1 for _ in f)
+        elif "failures" in db.tablenames():
+            failures = db.count("failures")
+    finally:
+        db.close()
+    return {
+        "responses": sum(responses.values()),
+        "posts": sum(posts.values()),
+        "failures": failures,
+        "models": {
+            model: {"responses": responses[model], "posts": posts[model]}
+            for model in sorted(responses)
+        },
+        "account_types": dict(by_type.most_common()),
+    }
+
+
+# generate options that only the async engine has, as (flag, dest)
+ASYNC_ONLY = [
+    ("--max-in-flight", "max_in_flight"),
+    ("--per-endpoint-limit", "per_endpoint_limit"),
+    ("--stream", "stream"),
+    ("--max-posts", "max_posts"),
+    ("--samples-per-request", "samples_per_request"),
+]
+
+
+def generate(args):
+    import asyncio
+    import contextlib
+
+    with contextlib.ExitStack() as stack:
+        configs = None
+        if args.mock:
+            from mock_server import MockConfig, MockServer
+
+            server = stack.enter_context(MockServer(MockConfig(seed=0)))
+            configs = server.configs()
+        if args.sync:
+            from generate_posts import generate_posts
+
+            generate_posts(
+                report_every=args.report_every,
+                num_requests=args.num_requests,
+                configs=configs,
+                resume=args.resume,
+                db_path=args.db,
+                prompt_layout=args.prompt_layout,
+                metrics_port=args.metrics_port,
+                output_format=args.output_format,
+            )
+            return
+
+        from generate_posts import generate_posts_async
+
+        asyncio.run(
+            generate_posts_async(
+                max_in_flight=args.max_in_flight,
+                per_endpoint_limit=args.per_endpoint_limit,
+                num_requests=args.num_requests,
+                configs=configs,
+                db_path=args.db,
+                report_every=args.report_every,
+                resume=args.resume,
+                prompt_layout=args.prompt_layout,
+                stream=args.stream,
+                max_posts=args.max_posts,
+                samples_per_request=args.samples_per_request,
+                metrics_port=args.metrics_port,
+                output_format=args.output_format,
+            )
+        )
+
+
+def export(args):
+    from generate_posts import format_data_set
+
+    result = format_data_set(
+        streaming=args.streaming,
+        chunk_size=args.chunk_size,
+        db_path=args.db,
+        output_path=args.output,
+        categorical=not args.no_categorical,
+        compression=args.compression,
+        dedup=args.dedup,
+        dedup_threshold=args.dedup_threshold,
+        dedup_workers=args.dedup_workers,
+        append=args.append,
+        partition_by=args.partition_by,
+        workers=args.workers,
+    )
+    if isinstance(result, list):
+        result = len(result)
+    print(f"Exported to {args.output}: {result}")
+
+
+def stats(args):
+    result = db_stats(args.db)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(
+        f"{result['responses']} responses, {result['posts']} posts, "
+        f"{result['failures']} failures"
+    )
+    for model, counts in result["models"].items():
+        print(f"  {model}: {counts['responses']} responses, {counts['posts']} posts")
+    for account_type, n in result["account_types"].items():
+        print(f"  {account_type}: {n} posts")
+
+
+def bench(args):
+    from bench import main as bench_main
+
+    bench_main(args.extra)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="social-posts", description="Generate and export synthetic posts."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("generate", help="request posts into posts.db")
+    p.add_argument("--db", default="posts.db")
+    p.add_argument("--num-requests", type=int, help="stop after this many")
+    p.add_argument("--max-in-flight", type=int, default=64)
+    p.add_argument("--per-endpoint-limit", type=int, default=16)
+    p.add_argument("--stream", action="store_true")
+    p.add_argument("--max-posts", type=int)
+    p.add_argument("--samples-per-request", type=int, default=1)
+    p.add_argument("--output-format", choices=["text", "json", "tool"], default="text")
+    p.add_argument(
+        "--prompt-layout", choices=["classic", "prefix_cached"], default="classic"
+    )
+    p.add_argument("--report-every", type=int, default=100)
+    p.add_argument("--metrics-port", type=int)
+    p.add_argument("--resume", action="store_true", help="re-issue unfinished jobs")
+    p.add_argument("--sync", action="store_true", help="one request at a time")
+    p.add_argument("--mock", action="store_true", help="use a local mock server")
+    p.set_defaults(func=generate)
+
+    p = commands.add_parser("export", help="write posts.db out as Parquet")
+    p.add_argument("--db", default="posts.db")
+    p.add_argument("--output", default="social_media_posts.parquet")
+    p.add_argument("--streaming", action="store_true")
+    p.add_argument("--chunk-size", type=int, default=10_000)
+    p.add_argument("--no-categorical", action="store_true")
+    p.add_argument("--compression", default="zstd")
+    p.add_argument("--dedup", choices=["flag", "drop"])
+    p.add_argument("--dedup-threshold", type=float, default=0.8)
+    p.add_argument(
+        "--dedup-workers", type=int, default=1, help="processes for MinHash signatures"
+    )
+    p.add_argument("--append", action="store_true")
+    p.add_argument("--partition-by", nargs="+")
+    p.add_argument("--workers", type=int, default=1)
+    p.set_defaults(func=export)
+
+    p = commands.add_parser("stats", help="count what's in posts.db")
+    p.add_argument("--db", default="posts.db")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=stats)
+
+    p = commands.add_parser(
+        "bench", help="run bench.py (other arguments are passed on)", add_help=False
+    )
+    p.set_defaults(func=bench)
+    return parser
+
+
+def main(argv: list | None = None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    # Anything bench doesn't know goes on to bench.py's own parser
+    if extra and args.func is not bench:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.extra = extra
+    if args.func is stats and not os.path.exists(args.db):
+        parser.error(f"no such store: {args.db}")
+    if args.func is generate and args.sync:
+        defaults = vars(parser.parse_args(["generate"]))
+        given = [
+            flag for flag, dest in ASYNC_ONLY if getattr(args, dest) != defaults[dest]
+        ]
+        if given:
+            parser.error(f"--sync doesn't support {', '.join(given)}")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
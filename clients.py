@@ -0,0 +1,119 @@
+"""Long-lived OpenAI clients, one per entry in MODEL_CONFIGS.
+
+Building a fresh ``OpenAI(...)`` per request throws away its connection
+pool, so every call pays a new TCP/TLS handshake. ``ClientPool`` builds one
+client per config key up front and keeps the connections alive between
+requests. Connection reuse is tracked through httpx's ``trace`` extension so
+you can check that handshakes have actually gone away.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    connections: int = 0
+    tls_handshakes: int = 0
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.connections, 0)
+
+    @property
+    def reuse_rate(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+
+class ClientPool:
+    """One OpenAI (or AsyncOpenAI) client per config key, created once."""
+
+    def __init__(
+        self,
+        configs: dict,
+        asynchronous: bool = False,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 5 * 60.0,
+        max_retries: int = 0,
+    ):
+        import httpx
+        from openai import (
+            AsyncOpenAI,
+            DefaultAsyncHttpxClient,
+            DefaultHttpxClient,
+            OpenAI,
+        )
+
+        self.asynchronous = asynchronous
+        self.stats = {key: ConnectionStats() for key in configs}
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        client_cls = AsyncOpenAI if asynchronous else OpenAI
+        http_cls = DefaultAsyncHttpxClient if asynchronous else DefaultHttpxClient
+
+        self.clients = {}
+        for key, config in configs.items():
+            http_client = http_cls(
+                limits=limits,
+                event_hooks={"request": [self._request_hook(self.stats[key])]},
+            )
+            self.clients[key] = client_cls(
+                base_url=config["host_url"],
+                api_key=config["api_key"],
+                timeout=timeout,
+                # Retries and backoff are handled by the generation loop
+                max_retries=max_retries,
+                http_client=http_client,
+            )
+
+    def _request_hook(self, stats: ConnectionStats):
+        """Count requests and attach a trace callback that counts handshakes."""
+
+        def on_trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                stats.connections += 1
+            elif event_name == "connection.start_tls.complete":
+                stats.tls_handshakes += 1
+
+        if self.asynchronous:
+
+            async def on_trace_async(event_name: str, info: dict):
+                on_trace(event_name, info)
+
+            async def on_request(request):
+                stats.requests += 1
+                request.extensions["trace"] = on_trace_async
+
+        else:
+
+            def on_request(request):
+                stats.requests += 1
+                request.extensions["trace"] = on_trace
+
+        return on_request
+
+    def __getitem__(self, key: str):
+        return self.clients[key]
+
+    def report(self) -> str:
+        """One line per endpoint with request, connection and reuse counts."""
+        lines = []
+        for key, s in self.stats.items():
+            lines.append(
+                f"{key}: {s.requests} requests, {s.connections} connections "
+                f"({s.tls_handshakes} TLS), {s.reuse_rate:.1%} reused"
+            )
+        return "\n".join(lines)
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+
+    async def aclose(self):
+        for client in self.clients.values():
+            await client.close()
@@ -0,0 +1,173 @@
+"""Near-duplicate post detection with MinHash signatures and an LSH index.
+
+Low-temperature runs of the same persona (bots and spam especially) repeat
+themselves almost word for word. Each post is reduced to a MinHash
+signature over its word 3-grams, and an LSH index over signature bands
+finds earlier posts that are likely similar without comparing every pair.
+Candidates are confirmed by the estimated Jaccard similarity before a post
+is called a duplicate, and the first post of each cluster is kept as its
+representative.
+
+``NearDuplicateFilter`` works chunk by chunk, so it runs inside the
+streaming export, and it can spread signature computation over processes.
+"""
+
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+
+
+def shingle_hashes(post: str, k: int = 3) -> np.ndarray:
+    """crc32 of every lower-cased word k-gram (the whole post if shorter)."""
+    words = WORD.findall(post.lower()) or [post]
+    grams = [" ".join(words[i : i + k]) for i in range(max(len(words) - k + 1, 1))]
+    return np.fromiter(
+        (zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams)
+    )
+
+
+def hash_params(num_perm: int, seed: int = 1) -> tuple:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(posts: list, num_perm: int = 64, seed: int = 1) -> np.ndarray:
+    """(len(posts), num_perm) uint32 MinHash signatures.
+
+    Uses multiply-shift hashing (wrapping uint64 arithmetic, top 32 bits)
+    and one np.minimum.reduceat over the shingles of a whole chunk of posts.
+    """
+    a, b = hash_params(num_perm, seed)
+    out = np.empty((len(posts), num_perm), dtype=np.uint32)
+    step = 2048
+    for start in range(0, len(posts), step):
+        hashes = [shingle_hashes(p) for p in posts[start : start + step]]
+        lengths = np.fromiter((len(h) for h in hashes), dtype=np.int64)
+        flat = np.concatenate(hashes)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        with np.errstate(over="ignore"):
+            permuted = (a[:, None] * flat[None, :] + b[:, None]) >> np.uint64(32)
+        out[start : start + len(hashes)] = np.minimum.reduceat(
+            permuted, offsets, axis=1
+        ).T
+    return out
+
+
+def _signatures_job(args):
+    return minhash_signatures(*args)
+
+
+def choose_bands(num_perm: int, threshold: float) -> int:
+    """Band count whose LSH threshold (1/b)^(1/r) is closest to ``threshold``."""
+    options = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda b: abs((1 / b) ** (b / num_perm) - threshold))
+
+
+class NearDuplicateFilter:
+    """Incremental MinHash/LSH index over posts.
+
+    ``add(posts)`` returns, for each post, the global index of the earlier
+    post it duplicates, or -1 if it is new. Only representatives' signatures
+    are kept in memory.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        seed: int = 1,
+        workers: int = 1,
+    ):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.seed = seed
+        self.workers = workers
+        self.bands = choose_bands(num_perm, threshold)
+        self.rows = num_perm // self.bands
+        self.buckets = [{} for _ in range(self.bands)]
+        self.representatives = {}
+        self.seen = 0
+        self.clusters = defaultdict(int)  # representative -> duplicates
+
+    def signatures(self, posts: list) -> np.ndarray:
+        if self.workers <= 1 or len(posts) < 10_000:
+            return minhash_signatures(posts, self.num_perm, self.seed)
+        from concurrent.futures import ProcessPoolExecutor
+
+        size = -(-len(posts) // self.workers)
+        jobs = [
+            (posts[i : i + size], self.num_perm, self.seed)
+            for i in range(0, len(posts), size)
+        ]
+        with ProcessPoolExecutor(self.workers) as pool:
+            return np.concatenate(list(pool.map(_signatures_job, jobs)))
+
+    def add(self, posts: list) -> np.ndarray:
+        signatures = self.signatures(posts)
+        duplicate_of = np.full(len(posts), -1, dtype=np.int64)
+        for i, signature in enumerate(signatures):
+            index = self.seen + i
+            keys = [
+                signature[band * self.rows : (band + 1) * self.rows].tobytes()
+                for band in range(self.bands)
+            ]
+            match = -1
+            for band, key in enumerate(keys):
+                candidate = self.buckets[band].get(key)
+                if candidate is None:
+                    continue
+                similarity = np.mean(self.representatives[candidate] == signature)
+                if similarity >= self.threshold:
+                    match = candidate
+                    break
+            if match >= 0:
+                duplicate_of[i] = match
+                self.clusters[match] += 1
+                continue
+            self.representatives[index] = signature
+            for band, key in enumerate(keys):
+                self.buckets[band].setdefault(key, index)
+        self.seen += len(posts)
+        return duplicate_of
+
+
+class DuplicateReport:
+    """Duplicate counts per (persona, model), filled in chunk by chunk."""
+
+    def __init__(self):
+        self.posts = defaultdict(int)
+        self.duplicates = defaultdict(int)
+        self.clusters = defaultdict(set)
+
+    def add(self, personas: list, models: list, duplicate_of: np.ndarray):
+        for persona, model, dup in zip(personas, models, duplicate_of.tolist()):
+            self.posts[(persona, model)] += 1
+            if dup >= 0:
+                self.duplicates[(persona, model)] += 1
+                self.clusters[(persona, model)].add(dup)
+
+    def summary(self, top: int = 20) -> list:
+        """Cells with the most duplicates:
+        (persona, model, posts, duplicates, clusters)."""
+        rows = [
+            (*cell, self.posts[cell], n, len(self.clusters[cell]))
+            for cell, n in self.duplicates.items()
+        ]
+        return sorted(rows, key=lambda row: row[3], reverse=True)[:top]
+
+    def report(self, top: int = 20) -> str:
+        total = sum(self.posts.values())
+        dups = sum(self.duplicates.values())
+        lines = [f"{dups} of {total} posts are near-duplicates"]
+        for persona, model, posts, n, clusters in self.summary(top):
+            lines.append(
+                f"{persona} / {model}: {n} of {posts} ({n / posts:.1%}) "
+                f"in {clusters} clusters"
+            )
+        return "\n".join(lines)
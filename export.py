@@ -0,0 +1,287 @@
+"""Incremental Parquet export: only the responses added since the last run.
+
+posts.db's rowid only ever grows (SqliteDict writes with REPLACE INTO, so an
+overwritten record gets a new rowid too), which makes it a watermark.
+``export_new()`` reads the rows past the watermark kept in the export
+directory's ``_export.json``, writes them as one new part file and moves the
+watermark forward, so an export takes time in proportion to what's new.
+``compact_export()`` folds the parts back into one file, keeping only the
+latest version of any response that was regenerated in between.
+
+``export_parallel()`` does a full export on several cores: it splits the
+rowids into ranges with equal row counts, and each worker process decodes,
+splits and writes its own range as one part. Parts are named by rowid
+range, so reading the directory gives the same rows in the same order as a
+single-file export, and the manifest it leaves lets ``export_new()`` carry
+on appending from there.
+
+    export_parallel("posts.db", "social_media_posts", workers=8)
+    export_new("posts.db", "social_media_posts")    # after each generation run
+    compact_export("social_media_posts")            # now and then
+    pd.read_parquet("social_media_posts")           # reads every part
+"""
+
+import itertools
+import json
+import os
+
+STATE_FILE = "_export.json"
+
+
+def read_state(output_dir: str) -> dict:
+    path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {"watermark": 0, "parts": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(output_dir: str, state: dict):
+    """Replace _export.json atomically."""
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def part_name(first: int, last: int) -> str:
+    return f"part-{first:010d}-{last:010d}.parquet"
+
+
+def iter_rows(db_path: str, after: int, upto: int, tablename: str = "unnamed"):
+    """Decoded records with after < rowid <= upto, in rowid order."""
+    import sqlite3
+
+    from store import decode_record
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(
+            f'SELECT value FROM "{tablename}" WHERE rowid > ? AND rowid <= ? '
+            "ORDER BY rowid",
+            (after, upto),
+        )
+        for (value,) in cursor:
+            yield decode_record(value)
+    finally:
+        conn.close()
+
+
+def max_rowid(db_path: str, tablename: str = "unnamed") -> int:
+    import sqlite3
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        (rowid,) = conn.execute(f'SELECT MAX(rowid) FROM "{tablename}"').fetchone()
+    finally:
+        conn.close()
+    return rowid or 0
+
+
+def rowid_ranges(db_path: str, parts: int, tablename: str = "unnamed") -> list:
+    """Split the table into up to ``parts`` (after, upto] rowid ranges with
+    about the same number of rows each."""
+    import sqlite3
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        (count,) = conn.execute(f'SELECT COUNT(*) FROM "{tablename}"').fetchone()
+        bounds = [0]
+        for i in range(1, parts):
+            offset = count * i // parts - 1
+            if offset < 0:
+                continue
+            row = conn.execute(
+                f'SELECT rowid FROM "{tablename}" ORDER BY rowid LIMIT 1 OFFSET ?',
+                (offset,),
+            ).fetchone()
+            if row and row[0] > bounds[-1]:
+                bounds.append(row[0])
+        (last,) = conn.execute(f'SELECT MAX(rowid) FROM "{tablename}"').fetchone()
+    finally:
+        conn.close()
+    if not last:
+        return []
+    if last > bounds[-1]:
+        bounds.append(last)
+    return list(itertools.pairwise(bounds))
+
+
+def _export_range(args) -> dict:
+    """Worker: one rowid range of posts.db to one temporary part file."""
+    from generate_posts import _write_posts_streaming, iter_chunks, responses_table
+
+    db_path, output_dir, after, upto, options = args
+    chunk_size, categorical, compression, row_group_size = options
+    responses = 0
+
+    def counted(records):
+        nonlocal responses
+        for record in records:
+            responses += 1
+            yield record
+
+    name = part_name(after + 1, upto)
+    chunks = iter_chunks(counted(iter_rows(db_path, after, upto)), chunk_size)
+    n_posts = _write_posts_streaming(
+        (responses_table(chunk, categorical) for chunk in chunks),
+        os.path.join(output_dir, f".{name}.tmp"),
+        categorical,
+        compression,
+        row_group_size,
+    )
+    return {"file": name, "responses": responses, "posts": n_posts}
+
+
+def export_parallel(
+    db_path: str = "posts.db",
+    output_dir: str = "social_media_posts",
+    workers: int | None = None,
+    chunk_size: int = 10_000,
+    categorical: bool = True,
+    compression: str = "zstd",
+    row_group_size: int = 128 * 1024,
+) -> dict:
+    """Export all of posts.db as one part per worker, in parallel.
+
+    Replaces whatever parts ``output_dir`` already has. The new parts are
+    only moved into place once every worker has finished, so a failed run
+    leaves the previous export as it was.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from store import is_segment_store
+
+    if is_segment_store(db_path):
+        raise ValueError("parallel exports split posts.db rowids, not segment stores")
+    if os.path.isfile(output_dir):
+        raise ValueError(f"{output_dir} is a file; parallel exports need a directory")
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    ranges = rowid_ranges(db_path, workers)
+    options = (chunk_size, categorical, compression, row_group_size)
+    jobs = [(db_path, output_dir, after, upto, options) for after, upto in ranges]
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(min(workers, len(jobs))) as pool:
+            parts = list(pool.map(_export_range, jobs))
+    else:
+        parts = [_export_range(job) for job in jobs]
+
+    old = read_state(output_dir)["parts"]
+    for part in parts:
+        name = part["file"]
+        os.replace(
+            os.path.join(output_dir, f".{name}.tmp"), os.path.join(output_dir, name)
+        )
+    write_state(
+        output_dir, {"watermark": ranges[-1][1] if ranges else 0, "parts": parts}
+    )
+    current = {part["file"] for part in parts}
+    for part in old:
+        if part["file"] not in current:
+            os.remove(os.path.join(output_dir, part["file"]))
+    return {
+        "responses": sum(p["responses"] for p in parts),
+        "posts": sum(p["posts"] for p in parts),
+        "parts": len(parts),
+    }
+
+
+def export_new(
+    db_path: str = "posts.db",
+    output_dir: str = "social_media_posts",
+    chunk_size: int = 10_000,
+    categorical: bool = True,
+    compression: str = "zstd",
+    row_group_size: int = 128 * 1024,
+) -> dict:
+    """Write the responses added since the last export as a new part file.
+
+    The range is fixed at the DB's current max rowid up front, so rows that
+    arrive while exporting go to the next run. Re-running after a crash
+    rewrites the same part.
+    """
+    from generate_posts import _write_posts_streaming, iter_chunks, responses_table
+    from store import is_segment_store
+
+    if is_segment_store(db_path):
+        raise ValueError("append exports follow posts.db rowids, not segment stores")
+    if os.path.isfile(output_dir):
+        raise ValueError(f"{output_dir} is a file; append exports need a directory")
+    os.makedirs(output_dir, exist_ok=True)
+    state = read_state(output_dir)
+    first, last = state["watermark"] + 1, max_rowid(db_path)
+    if last < first:
+        return {"responses": 0, "posts": 0, "part": None}
+
+    responses = 0
+
+    def counted(records):
+        nonlocal responses
+        for record in records:
+            responses += 1
+            yield record
+
+    name = part_name(first, last)
+    tmp = os.path.join(output_dir, f".{name}.tmp")
+    chunks = iter_chunks(counted(iter_rows(db_path, first - 1, last)), chunk_size)
+    n_posts = _write_posts_streaming(
+        (responses_table(chunk, categorical) for chunk in chunks),
+        tmp,
+        categorical,
+        compression,
+        row_group_size,
+    )
+    os.replace(tmp, os.path.join(output_dir, name))
+    state["watermark"] = last
+    state["parts"].append({"file": name, "responses": responses, "posts": n_posts})
+    write_state(output_dir, state)
+    return {"responses": responses, "posts": n_posts, "part": name}
+
+
+def compact_export(
+    output_dir: str = "social_media_posts",
+    compression: str = "zstd",
+    row_group_size: int = 128 * 1024,
+) -> dict:
+    """Merge every part into one, dropping posts of responses that a later
+    part has a newer version of."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    state = read_state(output_dir)
+    parts = state["parts"]
+    if len(parts) < 2:
+        return {"parts": len(parts), "posts": sum(p["posts"] for p in parts)}
+    paths = [os.path.join(output_dir, p["file"]) for p in parts]
+
+    # Walk newest to oldest: a response id seen in a later part is stale here
+    newer = set()
+    stale = {}
+    for path in reversed(paths):
+        ids = pc.unique(pq.read_table(path, columns=["user_id"])["user_id"])
+        stale[path] = pa.array(sorted(newer), pa.string())
+        newer.update(ids.to_pylist())
+
+    name = part_name(int(parts[0]["file"].split("-")[1]), state["watermark"])
+    tmp = os.path.join(output_dir, f".{name}.tmp")
+    n_posts = 0
+    with pq.ParquetWriter(
+        tmp, pq.read_schema(paths[0]), compression=compression
+    ) as writer:
+        for path in paths:
+            table = pq.read_table(path)
+            if len(stale[path]):
+                keep = pc.invert(pc.is_in(table["user_id"], value_set=stale[path]))
+                table = table.filter(keep)
+            writer.write_table(table, row_group_size=row_group_size)
+            n_posts += table.num_rows
+    os.replace(tmp, os.path.join(output_dir, name))
+
+    state["parts"] = [{"file": name, "responses": len(newer), "posts": n_posts}]
+    write_state(output_dir, state)
+    for path in paths:
+        if os.path.basename(path) != name:
+            os.remove(path)
+    return {"parts": len(parts), "posts": n_posts}
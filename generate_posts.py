@@ -1,6 +1,9 @@
+import json
 import random
-
-import pandas as pd
+import re
+from collections import Counter
+from functools import cache
+from typing import NamedTuple
 
 # 🗂️ Master data structure - ONE PLACE to edit everything
 ACCOUNT_DATA = {
@@ -568,6 +571,71 @@ ACCOUNT_DATA = {
 }
 
 
+def validate_account_data(account_data: dict):
+    """Raise ValueError listing every problem in an ACCOUNT_DATA-shaped dict.
+
+    Catches what sampling would otherwise paper over, e.g. a typo in a
+    persona_mappings key silently falling back to random sampling.
+    """
+    problems = []
+    seen_personas = {}
+    for account_type, data in account_data.items():
+        where = f"ACCOUNT_DATA[{account_type!r}]"
+        unknown_keys = set(data) - {
+            "weight",
+            "personas",
+            "modifiers",
+            "persona_mappings",
+        }
+        if unknown_keys:
+            problems.append(f"{where} has unknown keys {sorted(unknown_keys)}")
+        weight = data.get("weight")
+        if not isinstance(weight, (int, float)) or weight <= 0:
+            problems.append(f"{where}['weight'] must be a positive number")
+        personas = data.get("personas", [])
+        if not personas:
+            problems.append(f"{where} has no personas")
+        for persona in personas:
+            if persona in seen_personas:
+                problems.append(
+                    f"persona {persona!r} is in both {seen_personas[persona]!r} "
+                    f"and {account_type!r}"
+                )
+            seen_personas[persona] = account_type
+        modifiers = data.get("modifiers", {})
+        for category, options in modifiers.items():
+            if not options:
+                problems.append(f"{where} modifier {category!r} has no options")
+            elif len(set(options)) != len(options):
+                problems.append(f"{where} modifier {category!r} repeats options")
+        for persona, mapping in data.get("persona_mappings", {}).items():
+            if persona not in personas:
+                problems.append(f"{where} maps unknown persona {persona!r}")
+            for category, value in mapping.items():
+                if category not in modifiers:
+                    problems.append(
+                        f"{where} mapping for {persona!r} uses unknown "
+                        f"modifier {category!r}"
+                    )
+                    continue
+                values = value if isinstance(value, list) else [value]
+                if not values:
+                    problems.append(
+                        f"{where} mapping for {persona!r} has no {category!r} values"
+                    )
+                for v in values:
+                    if v not in modifiers[category]:
+                        problems.append(
+                            f"{where} mapping for {persona!r} has {category!r} "
+                            f"value {v!r} that isn't one of its options"
+                        )
+    if problems:
+        raise ValueError("Invalid ACCOUNT_DATA:\n" + "\n".join(problems))
+
+
+validate_account_data(ACCOUNT_DATA)
+
+
 # ---------- SIMPLIFIED FUNCTIONS USING MASTER DATA ---------- #
 
 
@@ -616,40 +684,35 @@ def sample_account() -> dict:
     }
 
 
-def generate_system_prompt(account: dict) -> str:
-    """Generate a system prompt using simplified, consistent formatting."""
+def _readable(name: str) -> str:
+    """Convert underscores to spaces and title case for readability"""
+    return name.replace("_", " ").title()
 
-    persona = account["persona"]
-    modifiers = account["modifiers"]
-    account_type = account["account_type"]
 
-    # Convert underscores to spaces and title case for readability
-    persona_readable = persona.replace("_", " ").title()
-    account_type_readable = account_type.replace("_", " ").title()
+def _readable_labels() -> dict:
+    names = set()
+    for account_type, data in ACCOUNT_DATA.items():
+        names.add(account_type)
+        names.update(data["personas"])
+        for category, options in data["modifiers"].items():
+            names.add(category)
+            names.update(options)
+        for mapping in data.get("persona_mappings", {}).values():
+            for value in mapping.values():
+                names.update(value if isinstance(value, list) else [value])
+    return {name: _readable(name) for name in names}
 
-    # Build modifier list using simple, consistent format
-    modifier_lines = []
-    if modifiers:
-        modifier_lines.append("CHARACTERISTICS:")
-        for key, value in modifiers.items():
-            key_readable = key.replace("_", " ").title()
-            value_readable = value.replace("_", " ").title()
-            modifier_lines.append(f"- {key_readable}: {value_readable}")
-
-    modifier_text = (
-        "\n".join(modifier_lines)
-        if modifier_lines
-        else "No specific characteristics defined."
-    )
 
-    prompt = f"""You are roleplaying as a social media account with the following characteristics:
+# Every label in ACCOUNT_DATA, made readable once instead of on every prompt
+READABLE = _readable_labels()
+
 
-ACCOUNT TYPE: {account_type_readable}
-PERSONA: {persona_readable}
+def readable(name: str) -> str:
+    label = READABLE.get(name)
+    return label if label is not None else _readable(name)
 
-{modifier_text}
 
-Generate a list of realistic social media posts that this account would make. Each post should:
+POST_GUIDELINES = """Generate a list of realistic social media posts that this account would make. Each post should:
 
 1. Reflect the persona's personality and characteristics from above
 2. Use language, tone, and topics appropriate for this specific account type and persona
@@ -661,7 +724,12 @@ Generate a list of realistic social media posts that this account would make. Ea
 8. For spam/scam accounts: use manipulative language and questionable offers typical of scams
 
 Be creative and authentic - make these posts feel like they come from this specific type of account
+"""
 
+# How to lay out the posts, per output format. The structured formats get
+# the layout from the schema, so they only need to know where posts go.
+FORMAT_INSTRUCTIONS = {
+    "text": """
 
 Return a list of posts separated by double newlines. Do not number the posts. The format should be:
 
@@ -674,87 +742,1068 @@ post3
 post4
 
 and so on...
-"""
+""",
+    "json": """
+Return the posts in the "posts" array, one string per post. Do not number the posts.
+""",
+}
+FORMAT_INSTRUCTIONS["tool"] = FORMAT_INSTRUCTIONS["json"]
+PROMPT_INSTRUCTIONS = POST_GUIDELINES + FORMAT_INSTRUCTIONS["text"]
 
-    return prompt
+# "prefix_cached" puts the instructions, identical for every account, first
+# so vLLM-style automatic prefix caching can reuse them across requests
+PROMPT_LAYOUTS = ("classic", "prefix_cached")
 
 
-def generate_posts():
-    # Model configurations
-    import time
-    from uuid import uuid4
+@cache
+def _prompt_template(
+    account_type: str, persona: str, layout: str, output_format: str = "text"
+) -> tuple:
+    """(text before the CHARACTERISTICS block, text after it)"""
+    if output_format not in FORMAT_INSTRUCTIONS:
+        raise ValueError(f"output_format must be one of {tuple(FORMAT_INSTRUCTIONS)}")
+    instructions = POST_GUIDELINES + FORMAT_INSTRUCTIONS[output_format]
+    account_block = (
+        f"ACCOUNT TYPE: {readable(account_type)}\nPERSONA: {readable(persona)}\n\n"
+    )
+    if layout == "classic":
+        head = (
+            "You are roleplaying as a social media account with the following "
+            "characteristics:\n\n" + account_block
+        )
+        return head, "\n\n" + instructions
+    if layout == "prefix_cached":
+        head = (
+            "You are roleplaying as a social media account. The account you are "
+            "playing is described at the end.\n\n"
+            + instructions.replace("from above", "described below")
+            + "\nThe account:\n\n"
+            + account_block
+        )
+        return head, "\n"
+    raise ValueError(
+        f"Unknown prompt layout {layout!r}, expected one of {PROMPT_LAYOUTS}"
+    )
 
-    from openai import OpenAI
-    from sqlitedict import SqliteDict
 
-    db = SqliteDict("posts.db", autocommit=True)
-    # Add your host URLs here. I had deployed models on modal.
-    configs = {
-        "Qwen/Qwen2.5-7B-Instruct": {
-            "host_url": "<your-host-url>/v1",
-            "model": "Qwen/Qwen2.5-7B-Instruct",
-            "api_key": "not-needed",
-        },
-        "google/gemma-3-12b-it": {
-            "host_url": "<your-host-url>/v1",
-            "model": "google/gemma-3-12b-it",
-            "api_key": "not-needed",
-        },
-        "Qwen/Qwen2.5-32B-Instruct": {
-            "host_url": "<your-host-url>/v1",
-            "model": "Qwen/Qwen2.5-32B-Instruct",
-            "api_key": "not-needed",
-        },
-        "Qwen/Qwen2.5-72B-Instruct": {
-            "host_url": "<your-host-url>/v1",
-            "model": "Qwen/Qwen2.5-72B-Instruct",
-            "api_key": "not-needed",
-        },
-    }
+def generate_system_prompt(
+    account: dict, layout: str = "classic", output_format: str = "text"
+) -> str:
+    """Generate a system prompt using simplified, consistent formatting.
 
-    while True:
-        account = sample_account()
-        system_prompt = generate_system_prompt(account)
-        config_key = random.choice(list(configs.keys()))
-        config = configs[config_key]
-        model = config["model"]
-        ct = time.time()
-        client = OpenAI(
-            base_url=config["host_url"],
-            api_key=config["api_key"],
-            timeout=60.0 * 60.0,  # 1 hour timeout for long requests
+    Everything but the CHARACTERISTICS block comes from a template cached per
+    (account_type, persona, layout, output_format).
+    """
+    head, tail = _prompt_template(
+        account["account_type"], account["persona"], layout, output_format
+    )
+
+    # Build modifier list using simple, consistent format
+    modifiers = account["modifiers"]
+    if modifiers:
+        modifier_text = "CHARACTERISTICS:\n" + "\n".join(
+            f"- {readable(key)}: {readable(value)}" for key, value in modifiers.items()
         )
-        response = client.chat.completions.create(
-            model=config["model"],
-            temperature=round(random.uniform(0, 1.0), 2),
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt,
-                },
-                {
-                    "role": "user",
-                    "content": "Generate a list of realistic social media posts that this account would make. Separate each post with a double newline. Do not number the posts.",
+    else:
+        modifier_text = "No specific characteristics defined."
+
+    return head + modifier_text + tail
+
+
+# Add your host URLs here. I had deployed models on modal.
+MODEL_CONFIGS = {
+    "Qwen/Qwen2.5-7B-Instruct": {
+        "host_url": "<your-host-url>/v1",
+        "model": "Qwen/Qwen2.5-7B-Instruct",
+        "api_key": "not-needed",
+    },
+    "google/gemma-3-12b-it": {
+        "host_url": "<your-host-url>/v1",
+        "model": "google/gemma-3-12b-it",
+        "api_key": "not-needed",
+    },
+    "Qwen/Qwen2.5-32B-Instruct": {
+        "host_url": "<your-host-url>/v1",
+        "model": "Qwen/Qwen2.5-32B-Instruct",
+        "api_key": "not-needed",
+    },
+    "Qwen/Qwen2.5-72B-Instruct": {
+        "host_url": "<your-host-url>/v1",
+        "model": "Qwen/Qwen2.5-72B-Instruct",
+        "api_key": "not-needed",
+    },
+}
+
+USER_PROMPT = "Generate a list of realistic social media posts that this account would make. Separate each post with a double newline. Do not number the posts."
+STRUCTURED_USER_PROMPT = 'Generate a list of realistic social media posts that this account would make. Return them in the "posts" array, one string per post, with no numbering or commentary.'
+
+# "json" asks for POSTS_SCHEMA through response_format (guided decoding on
+# vLLM), "tool" through a forced call to a submit_posts tool. Both come back
+# as a list of posts instead of text to split on double newlines.
+OUTPUT_FORMATS = ("text", "json", "tool")
+POSTS_SCHEMA = {
+    "type": "object",
+    "properties": {"posts": {"type": "array", "items": {"type": "string"}}},
+    "required": ["posts"],
+    "additionalProperties": False,
+}
+
+
+def build_request(
+    config: dict,
+    account: dict,
+    n: int = 1,
+    layout: str = "classic",
+    output_format: str = "text",
+    system_prompt: str | None = None,
+) -> dict:
+    """Keyword arguments for chat.completions.create for one account.
+
+    ``n > 1`` asks for several samples of the same prompt in one request,
+    so the prompt is only prefilled once. ``layout`` and ``output_format``
+    (one of OUTPUT_FORMATS) are passed on to generate_system_prompt(), unless
+    the prompt was already built and is given as ``system_prompt``.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+    request = {
+        "model": config["model"],
+        "temperature": round(random.uniform(0, 1.0), 2),
+        "messages": [
+            {
+                "role": "system",
+                "content": system_prompt
+                or generate_system_prompt(account, layout, output_format),
+            },
+            {
+                "role": "user",
+                "content": USER_PROMPT
+                if output_format == "text"
+                else STRUCTURED_USER_PROMPT,
+            },
+        ],
+    }
+    if n > 1:
+        request["n"] = n
+    if output_format == "json":
+        request["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": "posts", "schema": POSTS_SCHEMA, "strict": True},
+        }
+    elif output_format == "tool":
+        request["tools"] = [
+            {
+                "type": "function",
+                "function": {
+                    "name": "submit_posts",
+                    "description": "Submit the generated posts.",
+                    "parameters": POSTS_SCHEMA,
                 },
-            ],
-        )
-        id = str(uuid4())
-        res = {
-            "model": model,
-            "id": id,
-            "posts": response.choices[0].message.content,
-            "account": account,
+            }
+        ]
+        request["tool_choice"] = {
+            "type": "function",
+            "function": {"name": "submit_posts"},
         }
-        db[id] = res
-        print(f"Generated Response in {time.time() - ct} seconds for {model}")
+    return request
+
+
+def response_posts(message, output_format: str = "text"):
+    """What to store as a record's ``posts`` for one response message.
+
+    Text output is stored as is and split at export. Structured output is
+    parsed into a list of posts here (possibly empty); when there is no
+    array of strings at all (the model ignored the format) the raw text is
+    stored and split like text output.
+    """
+    if output_format == "text":
+        return message.content
+    text = message.content or ""
+    if output_format == "tool" and message.tool_calls:
+        text = message.tool_calls[0].function.arguments
+    parser = JsonPostParser()
+    parser.feed(text)
+    return parser.posts if parser.found else text
 
 
-def format_data_set():
-    from sqlitedict import SqliteDict
+def make_record(
+    model: str,
+    posts: str,
+    account: dict,
+    request_id: str | None = None,
+    temperature: float | None = None,
+    usage: dict | None = None,
+) -> dict:
+    """The record shape stored in posts.db for one response.
+
+    ``posts`` is the raw response text, or the list of posts for a
+    structured-output response. ``temperature`` and ``usage`` (prompt and
+    completion tokens) are added when known.
+    """
+    from uuid import uuid4
+
+    record = {
+        "model": model,
+        "id": request_id or str(uuid4()),
+        "posts": posts,
+        "account": account,
+    }
+    if temperature is not None:
+        record["temperature"] = temperature
+    if usage is not None:
+        record["usage"] = usage
+    return record
+
+
+def request_stats(
+    model: str,
+    seconds: float,
+    contents: list,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+):
+    """metrics.RequestStats for one request's response texts."""
+    from metrics import RequestStats
+
+    posts = [post for content in contents for post in record_posts(content)]
+    return RequestStats(
+        model=model,
+        seconds=seconds,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        posts=len(posts),
+        post_chars=sum(len(post) for post in posts),
+    )
+
+
+class Job(NamedTuple):
+    """One planned request. Its id becomes the record id in posts.db.
+
+    A ``config_key`` of None leaves the endpoint to the LoadBalancer.
+    """
+
+    account: dict
+    config_key: str | None
+    id: str
+
+
+def new_job(account: dict, config_key: str | None = None) -> Job:
+    from uuid import uuid4
+
+    return Job(account, config_key, str(uuid4()))
+
+
+def sample_jobs(
+    layout: str = "classic", output_format: str = "text", batch_size: int = 1024
+):
+    """Endless (Job, system prompt) pairs for a run without planned jobs.
+
+    Accounts are drawn with catalog.sample_accounts() a batch at a time and
+    their prompts built from the catalog codes by AccountBatch.system_prompt().
+    """
+    from catalog import sample_accounts
+
+    while True:
+        batch = sample_accounts(batch_size)
+        for i in range(len(batch)):
+            yield (
+                new_job(batch.account(i)),
+                batch.system_prompt(i, layout, output_format),
+            )
+
+
+def _job_cell(job: Job) -> tuple:
+    return job.account["account_type"], job.account["persona"], job.config_key
+
+
+def _open_jobs(
+    jobs,
+    resume: bool,
+    db_path: str,
+    manifest=None,
+    prompt_layout: str = "classic",
+    output_format: str = "text",
+):
+    """(manifest, iterator over (Job, system prompt) pairs) for a run.
+
+    The system prompt is None where build_request() should build it from
+    the account. Without ``jobs`` the run is free-running: accounts come
+    from sample_jobs() for as long as the caller keeps pulling. Every job is
+    recorded in the manifest so ``resume=True`` can re-issue the ones that
+    never made it into posts.db, after which a free-running run goes back
+    to sampling.
+
+    A list of jobs is recorded up front; sampled jobs and any other iterable
+    are recorded one job at a time as they are pulled, unless the caller
+    passes the ``manifest`` its jobs source already records into (as
+    WorkQueue.iter_jobs() does), so every job goes in once, through one
+    connection.
+
+    With ``resume=True`` and a list, the unfinished jobs already in the
+    manifest count towards the list's (account_type, persona, model) cells
+    and only the rest of the list is added, so a fresh
+    ``QuotaPlanner.from_store()`` schedule doesn't generate those cells twice.
+    """
+    from store import JobManifest, manifest_path
+
+    recorded = manifest is not None
+    if manifest is None:
+        manifest = JobManifest(manifest_path(db_path))
+    pending = []
+    if resume:
+        # Everything planned so far minus what already made it into posts.db
+        pending = manifest.pending(db_path)
+        print(f"Resuming {len(pending)} unfinished jobs")
+    if isinstance(jobs, (list, tuple)):
+        if pending:
+            covered = Counter(_job_cell(job) for job in pending)
+            new = []
+            for job in jobs:
+                if covered[_job_cell(job)] > 0:
+                    covered[_job_cell(job)] -= 1
+                else:
+                    new.append(job)
+            print(f"{len(jobs) - len(new)} planned jobs already pending")
+            jobs = new
+        manifest.add(jobs)
+
+    def run():
+        for job in pending:
+            yield job, None
+        if jobs is None:
+            for job, system_prompt in sample_jobs(prompt_layout, output_format):
+                # Batched with the status changes
+                manifest.add([job], commit=False)
+                yield job, system_prompt
+        elif isinstance(jobs, (list, tuple)) or recorded:
+            for job in jobs:
+                yield job, None
+        else:
+            for job in jobs:
+                manifest.add([job], commit=False)
+                yield job, None
+
+    return manifest, run()
+
+
+def make_failure(job: Job, model: str, error: Exception, attempts: int) -> dict:
+    """The record stored in posts.db's failures table for a request that gave up."""
+    return {
+        "model": model,
+        "id": job.id,
+        "account": job.account,
+        "error": repr(error),
+        "attempts": attempts,
+    }
+
+
+class RequestAttempts:
+    """One request's attempts, shared by generate_posts() and its async twin.
+
+    The caller does the sleeping and the sending; this picks each attempt's
+    endpoint, reports the outcome to the LoadBalancer and GenerationMetrics
+    and decides whether another attempt is due:
+
+        while (delay := attempts.backoff()) is not None:
+            sleep(delay)
+            sleep(attempts.choose())
+            while not attempts.start():
+                # Another request took the circuit breaker's probe
+                sleep(attempts.choose())
+            try:
+                ...
+            except request_errors() as e:
+                attempts.failed(e)
+                continue
+            attempts.succeeded()
+    """
+
+    def __init__(self, job: Job, balancer, retry, metrics, configs: dict):
+        self.job = job
+        self.balancer = balancer
+        self.retry = retry
+        self.metrics = metrics
+        self.configs = configs
+        self.config_key = job.config_key
+        self.count = 0
+        self.started_at = None
+        self.error = None
+        self.ok = False
+
+    @property
+    def config(self) -> dict:
+        return self.configs[self.config_key]
+
+    @property
+    def model(self) -> str:
+        return self.config["model"]
+
+    def backoff(self) -> float | None:
+        """Seconds to wait before the next attempt, or None if there is none."""
+        from scheduler import is_retryable
+
+        if self.ok or self.count >= self.retry.attempts:
+            return None
+        if self.error is not None and not is_retryable(self.error):
+            return None
+        return self.retry.delay(self.count) if self.count else 0.0
+
+    def choose(self) -> float:
+        """Pick this attempt's endpoint; returns the wait for its circuit breaker."""
+        # Unpinned jobs go wherever the balancer says, retries included
+        if self.job.config_key is None:
+            self.config_key = self.balancer.choose()
+        return self.balancer.ready_in(self.config_key)
+
+    def start(self) -> bool:
+        """Start the attempt; False if the endpoint's circuit breaker refused it."""
+        started_at = self.balancer.start(self.config_key)
+        if started_at is None:
+            return False
+        self.count += 1
+        self.started_at = started_at
+        return True
+
+    def failed(self, error: Exception):
+        self.balancer.finish(self.config_key, self.started_at, ok=False)
+        self.metrics.record_error(self.model)
+        self.error = error
+        print(f"Request failed for {self.model}: {error!r}")
+
+    def succeeded(self):
+        self.balancer.finish(self.config_key, self.started_at)
+        self.ok = True
+
+    def failure(self) -> dict:
+        """The failures-table record once every attempt has failed."""
+        return make_failure(self.job, self.model, self.error, self.count)
+
+
+def generate_posts(
+    report_every: int = 100,
+    num_requests: int | None = None,
+    configs: dict | None = None,
+    target_mix: dict | None = None,
+    jobs=None,
+    resume: bool = False,
+    db_path: str = "posts.db",
+    request_timeout: float = 5 * 60.0,
+    retry=None,
+    prompt_layout: str = "classic",
+    metrics_port: int | None = None,
+    output_format: str = "text",
+):
+    """Generate posts one request at a time until interrupted.
+
+    Stops after ``num_requests`` requests if given. ``configs`` replaces
+    MODEL_CONFIGS, e.g. with a MockServer's. ``jobs`` is an optional
+    iterable of Jobs, e.g. a QuotaPlanner schedule; when given, exactly
+    those requests are made. Otherwise accounts and prompts come from the
+    catalog (sample_jobs()). Either way every job is tracked in a manifest
+    next to posts.db, and ``resume=True`` first re-issues the jobs that
+    never made it into posts.db.
+
+    Endpoints are picked by LoadBalancer, weighted towards the faster ones;
+    pass ``target_mix`` to fix each model's share of the requests instead.
+
+    Failed requests are retried per ``retry`` (a RetryPolicy) with jittered
+    backoff; ones that still fail are stored in the failures table.
+    ``prompt_layout="prefix_cached"`` puts the shared instructions ahead of
+    the account details so servers with prefix caching can reuse them.
+    ``output_format="json"`` or ``"tool"`` asks for a JSON array of posts
+    (see OUTPUT_FORMATS) instead of text split on double newlines.
+
+    Per-model tokens, latency and posts are tracked in a GenerationMetrics,
+    printed every ``report_every`` responses and returned at the end;
+    ``metrics_port`` also serves them in Prometheus format.
+    """
+    import time
+
+    from clients import ClientPool
+    from metrics import GenerationMetrics
+    from scheduler import LoadBalancer, RetryPolicy, request_errors
+    from store import open_writer
+
+    configs = configs or MODEL_CONFIGS
+    # A config entry can say how many GPUs serve it (default one)
+    metrics = GenerationMetrics(
+        {c["model"]: c.get("gpus", 1) for c in configs.values()}
+    )
+    if metrics_port:
+        metrics.serve(metrics_port)
+    retry = retry or RetryPolicy()
+    # Clients live for the whole run so connections are reused across requests
+    clients = ClientPool(configs, timeout=request_timeout)
+    balancer = LoadBalancer(configs, target_mix=target_mix)
+    manifest, jobs = _open_jobs(
+        jobs, resume, db_path, prompt_layout=prompt_layout, output_format=output_format
+    )
+
+    n = 0
+    remaining = num_requests
+    # Ctrl-C raises inside the loop and the writer flushes its buffer on exit,
+    # as does the manifest
+    try:
+        with open_writer(db_path) as writer:
+            while remaining is None or remaining > 0:
+                if remaining is not None:
+                    remaining -= 1
+                pair = next(jobs, None)
+                if pair is None:
+                    break
+                job, system_prompt = pair
+                account, _, request_id = job
+                manifest.started(request_id)
+                attempts = RequestAttempts(job, balancer, retry, metrics, configs)
+                while (delay := attempts.backoff()) is not None:
+                    time.sleep(delay)
+                    # Waits out an open circuit breaker
+                    time.sleep(attempts.choose())
+                    while not attempts.start():
+                        time.sleep(attempts.choose())
+                    ct = time.time()
+                    request = build_request(
+                        attempts.config,
+                        account,
+                        layout=prompt_layout,
+                        output_format=output_format,
+                        system_prompt=system_prompt,
+                    )
+                    try:
+                        response = clients[attempts.config_key].chat.completions.create(
+                            **request
+                        )
+                    except request_errors() as e:
+                        attempts.failed(e)
+                        continue
+                    attempts.succeeded()
+                model = attempts.model
+                if not attempts.ok:
+                    writer.write_failure(attempts.failure())
+                    manifest.failed(request_id, repr(attempts.error))
+                    continue
+                content = response_posts(response.choices[0].message, output_format)
+                usage = response.usage
+                metrics.record(
+                    request_stats(
+                        model,
+                        time.time() - ct,
+                        [content],
+                        usage.prompt_tokens if usage else 0,
+                        usage.completion_tokens if usage else 0,
+                    )
+                )
+                res = make_record(
+                    model,
+                    content,
+                    account,
+                    request_id,
+                    request["temperature"],
+                    {
+                        "prompt_tokens": usage.prompt_tokens,
+                        "completion_tokens": usage.completion_tokens,
+                    }
+                    if usage
+                    else None,
+                )
+                writer.write(res)
+                manifest.done(request_id)
+                print(f"Generated Response in {time.time() - ct} seconds for {model}")
+                n += 1
+                if report_every and n % report_every == 0:
+                    print(balancer.report())
+                    print(clients.report())
+                    print(metrics.report())
+    finally:
+        manifest.flush()
+    print(metrics.report())
+    metrics.close()
+    print(manifest.summary())
+    manifest.close()
+    return metrics
 
-    db = SqliteDict("posts.db", autocommit=True)
+
+class PostSplitter:
+    """Incremental split_posts() for text that arrives in pieces.
+
+    ``feed()`` returns the posts completed by each new piece, i.e. everything
+    before the latest double newline; ``finish()`` returns the rest.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.posts = []
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        head, sep, self.buffer = self.buffer.rpartition("\n\n")
+        if not sep:
+            self.buffer = head + self.buffer
+            return []
+        posts = split_posts(head)
+        self.posts.extend(posts)
+        return posts
+
+    def finish(self) -> list:
+        posts = split_posts(self.buffer)
+        self.buffer = ""
+        self.posts.extend(posts)
+        return posts
+
+
+class JsonPostParser:
+    """Incremental parser for structured output, ``{"posts": ["...", ...]}``.
+
+    Same interface as PostSplitter: ``feed()`` returns the posts whose
+    closing quote arrived with the new piece. Strings are only decoded once
+    complete, so a truncated response still yields every finished post.
+    A string that isn't valid JSON (models without guided decoding write
+    things like ``\\q``) keeps its invalid escapes as literal text.
+    ``found`` is set once the text has turned out to hold an array of
+    strings, even an empty one.
+    """
+
+    SPECIAL = re.compile(r'["\\]')
+    SEPARATORS = re.compile(r"[\s,]*")
+    # A surrogate pair (an escaped emoji) has to be decoded as one escape
+    ESCAPE = re.compile(
+        r"\\u[dD][89abAB][0-9a-fA-F]{2}\\u[dD][c-fC-F][0-9a-fA-F]{2}"
+        r'|\\(?:u[0-9a-fA-F]{4}|["\\/bfnrt])'
+    )
+    SURROGATE = re.compile("[\ud800-\udfff]")
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.start = 0
+        self.state = "start"  # start -> array <-> string -> done
+        self.found = False
+        self.posts = []
+
+    @classmethod
+    def parse(cls, text: str) -> list:
+        parser = cls()
+        parser.feed(text)
+        return parser.posts
+
+    @classmethod
+    def decode(cls, string: str) -> str:
+        """A complete JSON string literal, quotes included, as text.
+
+        Lone surrogates (half an escaped emoji) become U+FFFD, since they
+        can't be encoded as UTF-8 for Arrow or the segment store.
+        """
+        try:
+            text = json.loads(string, strict=False)
+        except json.JSONDecodeError:
+            text = cls.ESCAPE.sub(lambda m: json.loads(f'"{m.group()}"'), string[1:-1])
+        if cls.SURROGATE.search(text):
+            text = text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+        return text
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        buf = self.buffer
+        posts = []
+        while self.state != "done":
+            if self.state == "start":
+                i = buf.find("[", self.pos)
+                if i < 0:
+                    self.pos = len(buf)
+                    break
+                self.state, self.pos = "array", i + 1
+            elif self.state == "array":
+                self.pos = self.SEPARATORS.match(buf, self.pos).end()
+                if self.pos >= len(buf):
+                    break
+                if buf[self.pos] != '"':
+                    # "]" or anything that isn't a string ends the array
+                    self.found = self.found or buf[self.pos] == "]"
+                    self.state = "done"
+                    break
+                self.state, self.start = "string", self.pos
+                self.pos += 1
+            else:
+                m = self.SPECIAL.search(buf, self.pos)
+                if m is None:
+                    self.pos = len(buf)
+                    break
+                if m.group() == "\\":
+                    if m.end() >= len(buf):
+                        # Wait for the escaped character
+                        self.pos = m.start()
+                        break
+                    self.pos = m.end() + 1
+                    continue
+                post = self.decode(buf[self.start : m.end()]).strip()
+                if post:
+                    posts.append(post)
+                self.found = True
+                self.state, self.pos = "array", m.end()
+        self.posts.extend(posts)
+        return posts
+
+    def finish(self) -> list:
+        """An unterminated last string is dropped; nothing more to return."""
+        self.state = "done"
+        return []
+
+
+async def stream_completion(
+    client,
+    request: dict,
+    max_posts: int | None = None,
+    output_format: str = "text",
+):
+    """Stream one chat completion, splitting posts as they arrive.
+
+    Stops reading (and closes the stream) once ``max_posts`` complete posts
+    have arrived. Returns what to store as the record's ``posts`` (as
+    response_posts() does: the text, trimmed to whole posts if it stopped
+    early, or the list of posts for structured output) and a StreamStats.
+    The stats' token counts are None when the server never reported usage,
+    which is always the case for a stream closed early.
+    """
+    import time
+
+    from metrics import StreamStats
+
+    ct = time.perf_counter()
+    ttft = None
+    chunks = []
+    usage = None
+    structured = output_format != "text"
+    splitter = JsonPostParser() if structured else PostSplitter()
+    stopped_early = False
+    stream = await client.chat.completions.create(
+        **request, stream=True, stream_options={"include_usage": True}
+    )
+    async for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if output_format == "tool" and chunk.choices[0].delta.tool_calls:
+            delta = chunk.choices[0].delta.tool_calls[0].function.arguments
+        if not delta:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - ct
+        chunks.append(delta)
+        splitter.feed(delta)
+        if max_posts and len(splitter.posts) >= max_posts:
+            stopped_early = True
+            await stream.close()
+            break
+    seconds = time.perf_counter() - ct
+
+    if stopped_early:
+        posts = splitter.posts[:max_posts]
+        text = posts if structured else "\n\n".join(posts)
+    else:
+        posts = splitter.posts + splitter.finish()
+        text = "".join(chunks)
+        if structured and splitter.found:
+            text = posts
+        elif structured:
+            # Fall back to splitting the text if it wasn't in the format
+            posts = split_posts(text)
+    stats = StreamStats(
+        ttft=ttft if ttft is not None else seconds,
+        seconds=seconds,
+        tokens=usage.completion_tokens if usage else None,
+        posts=len(posts),
+        stopped_early=stopped_early,
+        prompt_tokens=usage.prompt_tokens if usage else None,
+    )
+    return text, stats
+
+
+async def generate_posts_async(
+    max_in_flight: int = 64,
+    per_endpoint_limit: int = 16,
+    num_requests: int | None = None,
+    configs: dict | None = None,
+    db_path: str = "posts.db",
+    report_every: int = 100,
+    batch_size: int = 256,
+    flush_interval: float = 2.0,
+    target_mix: dict | None = None,
+    jobs=None,
+    resume: bool = False,
+    manifest=None,
+    request_timeout: float = 5 * 60.0,
+    retry=None,
+    prompt_layout: str = "classic",
+    stream: bool = False,
+    max_posts: int | None = None,
+    samples_per_request: int = 1,
+    metrics_port: int | None = None,
+    output_format: str = "text",
+    **pool_options,
+):
+    """Concurrent version of generate_posts() built on AsyncOpenAI.
+
+    At most ``max_in_flight`` requests are open at once across all endpoints,
+    and at most ``per_endpoint_limit`` per endpoint (a config entry can
+    override this with its own ``max_concurrency``). Endpoints are picked by
+    LoadBalancer, optionally steered towards ``target_mix``. Runs forever unless
+    ``num_requests`` is given, or until ``jobs`` (as in generate_posts()) runs
+    out. A ``manifest`` (JobManifest) that ``jobs`` already records into is
+    used instead of opening a second one on the same file; the caller closes
+    it. Use ``asyncio.run(generate_posts_async())``. Each attempt gets
+    ``request_timeout`` seconds in total once it has its endpoint slot.
+
+    With ``stream=True`` posts are split as tokens arrive, time to first
+    token, tokens/sec and time per post are reported per model, and a
+    response is cut off once it has ``max_posts`` posts.
+
+    ``samples_per_request > 1`` sets ``n`` so each request returns several
+    responses for the same account (and temperature). Each one is stored as
+    its own record; the first keeps the job id, the rest get ``<id>-<i>``.
+    For different accounts and temperatures sharing one prompt prefix, feed
+    the jobs through scheduler.batch_by_prefix() instead.
+
+    Returns the run's GenerationMetrics (per-model tokens, latency, posts),
+    which are also printed every ``report_every`` responses and, with
+    ``metrics_port``, served in Prometheus format. ``output_format`` is as
+    in generate_posts().
+    Extra keyword arguments (connection limits, keep-alive) go to ClientPool.
+    """
+    import asyncio
+    import time
+
+    from clients import ClientPool
+    from metrics import GenerationMetrics, StreamMetrics
+    from scheduler import LoadBalancer, RetryPolicy, request_errors
+    from store import open_writer
+
+    if stream and samples_per_request > 1:
+        raise ValueError("stream=True doesn't support samples_per_request > 1")
+    configs = configs or MODEL_CONFIGS
+    retry = retry or RetryPolicy()
+    stream_metrics = StreamMetrics()
+    # A config entry can say how many GPUs serve it (default one)
+    metrics = GenerationMetrics(
+        {c["model"]: c.get("gpus", 1) for c in configs.values()}
+    )
+    if metrics_port:
+        metrics.serve(metrics_port)
+    balancer = LoadBalancer(configs, per_endpoint_limit, target_mix=target_mix)
+    owns_manifest = manifest is None
+    manifest, jobs = _open_jobs(
+        jobs, resume, db_path, manifest, prompt_layout, output_format
+    )
+    writer = open_writer(db_path, batch_size=batch_size, flush_interval=flush_interval)
+    clients = ClientPool(
+        configs, asynchronous=True, timeout=request_timeout, **pool_options
+    )
+    endpoint_limits = {
+        key: asyncio.Semaphore(config.get("max_concurrency", per_endpoint_limit))
+        for key, config in configs.items()
+    }
+    remaining = num_requests
+    done = 0
+
+    async def worker():
+        nonlocal remaining, done
+        while remaining is None or remaining > 0:
+            if remaining is not None:
+                remaining -= 1
+            pair = next(jobs, None)
+            if pair is None:
+                return
+            job, system_prompt = pair
+            account, _, request_id = job
+            manifest.started(request_id)
+            attempts = RequestAttempts(job, balancer, retry, metrics, configs)
+            while (delay := attempts.backoff()) is not None:
+                await asyncio.sleep(delay)
+                # Waits out an open circuit breaker
+                await asyncio.sleep(attempts.choose())
+                # Counted from before the semaphore so queued work steers routing
+                while not attempts.start():
+                    # Another request took the circuit breaker's probe
+                    await asyncio.sleep(attempts.choose())
+                config_key, model = attempts.config_key, attempts.model
+                try:
+                    # The client's timeout is per read; this bounds the whole
+                    # request, however slowly a stream keeps trickling in
+                    async with (
+                        endpoint_limits[config_key],
+                        asyncio.timeout(request_timeout),
+                    ):
+                        ct = time.time()
+                        request = build_request(
+                            attempts.config,
+                            account,
+                            samples_per_request,
+                            prompt_layout,
+                            output_format,
+                            system_prompt,
+                        )
+                        if stream:
+                            content, stats = await stream_completion(
+                                clients[config_key], request, max_posts, output_format
+                            )
+                            stream_metrics.record(model, stats)
+                            contents = [content]
+                            # A stream cut off by max_posts never gets usage
+                            usage = (
+                                {
+                                    "prompt_tokens": stats.prompt_tokens,
+                                    "completion_tokens": stats.tokens,
+                                }
+                                if stats.tokens is not None
+                                else None
+                            )
+                            tokens = (
+                                (stats.prompt_tokens, stats.tokens) if usage else (0, 0)
+                            )
+                        else:
+                            response = await clients[
+                                config_key
+                            ].chat.completions.create(**request)
+                            contents = [
+                                response_posts(c.message, output_format)
+                                for c in response.choices
+                            ]
+                            tokens = (
+                                (
+                                    response.usage.prompt_tokens,
+                                    response.usage.completion_tokens,
+                                )
+                                if response.usage
+                                else (0, 0)
+                            )
+                            # Per-response token counts aren't known when n > 1
+                            usage = (
+                                {
+                                    "prompt_tokens": tokens[0],
+                                    "completion_tokens": tokens[1],
+                                }
+                                if response.usage and len(contents) == 1
+                                else None
+                            )
+                except request_errors() as e:
+                    attempts.failed(e)
+                    continue
+                attempts.succeeded()
+            if not attempts.ok:
+                writer.write_failure(attempts.failure())
+                manifest.failed(request_id, repr(attempts.error))
+                continue
+            metrics.record(request_stats(model, time.time() - ct, contents, *tokens))
+            for i, content in enumerate(contents):
+                sample_id = request_id if i == 0 else f"{request_id}-{i}"
+                # Buffered; commits happen in batches on the writer's thread
+                writer.write(
+                    make_record(
+                        model,
+                        content,
+                        account,
+                        sample_id,
+                        request["temperature"],
+                        usage,
+                    )
+                )
+            manifest.done(request_id)
+            print(f"Generated Response in {time.time() - ct} seconds for {model}")
+            done += 1
+            if report_every and done % report_every == 0:
+                print(balancer.report())
+                print(clients.report())
+                print(metrics.report())
+                if stream:
+                    print(stream_metrics.report())
+
+    try:
+        # One worker per in-flight slot gives the global cap for free
+        await asyncio.gather(*(worker() for _ in range(max_in_flight)))
+    finally:
+        print(balancer.report())
+        print(clients.report())
+        print(metrics.report())
+        if stream:
+            print(stream_metrics.report())
+        metrics.close()
+        await clients.aclose()
+        writer.close()
+        print(manifest.summary())
+        if owns_manifest:
+            manifest.close()
+    return metrics
+
+
+# Every modifier category across account types, in ACCOUNT_DATA order
+MODIFIER_COLUMNS = list(
+    dict.fromkeys(
+        category for data in ACCOUNT_DATA.values() for category in data["modifiers"]
+    )
+)
+POST_COLUMNS = [
+    "user_id",
+    "account_type",
+    "persona",
+    "model",
+    *MODIFIER_COLUMNS,
+    "post",
+]
+# Low-cardinality columns stored dictionary-encoded (pandas categoricals)
+CATEGORICAL_COLUMNS = ["account_type", "persona", "model", *MODIFIER_COLUMNS]
+
+
+def string_schema(names: list, categorical: bool = True):
+    """All-string Arrow schema, dictionary-encoding the CATEGORICAL_COLUMNS."""
+    import pyarrow as pa
+
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [
+            (
+                name,
+                dictionary
+                if categorical and name in CATEGORICAL_COLUMNS
+                else pa.string(),
+            )
+            for name in names
+        ]
+    )
+
+
+def split_posts(text: str) -> list:
+    """Split one raw response into posts, dropping blanks and --- separators."""
+    posts = text.split("\n\n")
+    posts = [p.strip() for p in posts if p.strip()]
+    posts = [p for p in posts if p]
+    posts = [p for p in posts if set(p) != set("-")]
+    return posts
+
+
+def record_posts(posts) -> list:
+    """A record's posts: already a list for structured output, else split."""
+    if isinstance(posts, list):
+        return posts
+    return split_posts(posts or "")
+
+
+def iter_chunks(iterable, chunk_size: int):
+    """Yield lists of up to chunk_size items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_records(responses) -> list:
+    """One flat dict per post: response metadata, modifiers and the post."""
     records = []
-    for k, v in db.items():
+    for v in responses:
         # Get account metadata
         account_metadata = {
             "user_id": v["id"],
@@ -766,21 +1815,423 @@ def format_data_set():
         account_metadata.update(v["account"]["modifiers"])
 
         # Process posts
-        posts = v["posts"].split("\n\n")
-        posts = [p.strip() for p in posts if p.strip()]
-        posts = [p for p in posts if p]
-        posts = [p for p in posts if set(p) != set("-")]
+        posts = record_posts(v["posts"])
 
         # Create one record per post
         for post in posts:
             record = account_metadata.copy()
             record["post"] = post
             records.append(record)
+    return records
+
+
+def format_data_set(
+    streaming: bool = False,
+    chunk_size: int = 10_000,
+    db_path: str = "posts.db",
+    output_path: str = "social_media_posts.parquet",
+    categorical: bool = True,
+    compression: str = "zstd",
+    row_group_size: int = 128 * 1024,
+    dedup: str | None = None,
+    dedup_threshold: float = 0.8,
+    dedup_workers: int = 1,
+    append: bool = False,
+    partition_by: list | None = None,
+    workers: int = 1,
+):
+    """Split every response in posts.db into one row per post and save as Parquet.
+
+    The default builds every record in memory and returns them. With
+    ``streaming=True`` the DB is read ``chunk_size`` responses at a time and
+    each chunk is appended to the file as its own row group, so memory
+    depends on ``chunk_size`` rather than the size of the DB (posts.db is
+    read through a sqlite3 cursor, see store.StoreReader); the number of
+    posts written is returned.
+
+    ``categorical`` stores account type, persona, model and modifier columns
+    dictionary-encoded, so they load as pandas categoricals. ``db_path`` can
+    also be a ``.segments`` store (segments.py), which is read columnar.
+
+    ``dedup="flag"`` adds a ``duplicate_of`` column holding the row number of
+    the earlier post each near-duplicate matches (null for the rest);
+    ``dedup="drop"`` leaves near-duplicates out. Matching uses the MinHash/LSH
+    index in dedup.py at estimated Jaccard >= ``dedup_threshold``, and a
+    per persona/model duplicate report is printed at the end.
+
+    ``append=True`` treats ``output_path`` as a directory and writes only the
+    responses added since the last append run as a new part file (see
+    export.py); it returns the counts for that part.
+
+    ``partition_by``, e.g. ``["account_type", "model"]``, writes
+    ``output_path`` as a Hive-partitioned directory instead of one file, so
+    load_posts() only opens the partitions a slice needs. Partitions being
+    rewritten are replaced; rows are sorted by persona within each write so
+    row-group statistics can skip the rest.
+
+    ``workers > 1`` exports posts.db on that many processes, one part file
+    per worker in a directory at ``output_path`` (see export.py), and
+    returns the counts.
+    """
+    from store import open_reader
+
+    if dedup not in (None, "flag", "drop"):
+        raise ValueError(f"dedup must be None, 'flag' or 'drop', not {dedup!r}")
+    if partition_by and (append or dedup == "flag"):
+        raise ValueError("partition_by can't be combined with append or dedup='flag'")
+    if workers > 1:
+        from export import export_parallel
+
+        if append or dedup or partition_by:
+            raise ValueError(
+                "workers can't be combined with append, dedup or partition_by"
+            )
+        return export_parallel(
+            db_path,
+            output_path,
+            workers,
+            chunk_size,
+            categorical,
+            compression,
+            row_group_size,
+        )
+    if append:
+        from export import export_new
+
+        if dedup:
+            raise ValueError("dedup needs the whole dataset; it can't run with append")
+        return export_new(
+            db_path, output_path, chunk_size, categorical, compression, row_group_size
+        )
+    duplicates = None
+    if dedup:
+        from dedup import DuplicateReport, NearDuplicateFilter
+
+        duplicates = (
+            NearDuplicateFilter(dedup_threshold, workers=dedup_workers),
+            DuplicateReport(),
+        )
+
+    db = open_reader(db_path)
+    if streaming:
+        try:
+            n_posts = _write_posts_streaming(
+                response_tables(db, chunk_size, categorical),
+                output_path,
+                categorical,
+                compression,
+                row_group_size,
+                dedup,
+                duplicates,
+                partition_by,
+            )
+        finally:
+            db.close()
+        if duplicates:
+            print(duplicates[1].report())
+        return n_posts
+
+    records = build_records(db.values())
+    db.close()
+    if duplicates:
+        index, report = duplicates
+        duplicate_of = index.add([r["post"] for r in records])
+        report.add(
+            [r["persona"] for r in records],
+            [r["model"] for r in records],
+            duplicate_of,
+        )
+        print(report.report())
+        if dedup == "drop":
+            records = [r for r, d in zip(records, duplicate_of.tolist()) if d < 0]
+        else:
+            for r, d in zip(records, duplicate_of.tolist()):
+                r["duplicate_of"] = d if d >= 0 else None
 
     # Convert to DataFrame
+    import pandas as pd
+
     df = pd.DataFrame(records)
+    if categorical:
+        for name in CATEGORICAL_COLUMNS:
+            if name in df:
+                df[name] = df[name].astype("category")
+    if "duplicate_of" in df:
+        df["duplicate_of"] = df["duplicate_of"].astype("Int64")
 
     # Save as parquet
-    df.to_parquet("social_media_posts.parquet", index=False)
+    if partition_by:
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        _write_partitioned(
+            [table],
+            table.schema,
+            output_path,
+            partition_by,
+            compression,
+            row_group_size,
+        )
+        return records
+    df.to_parquet(
+        output_path,
+        index=False,
+        compression=compression,
+        row_group_size=row_group_size,
+    )
 
     return records
+
+
+def load_posts(
+    path: str = "social_media_posts.parquet",
+    account_type=None,
+    persona=None,
+    model=None,
+    columns: list | None = None,
+    filter=None,
+    as_pandas: bool = True,
+):
+    """Load a slice of the export, reading only the bytes the slice needs.
+
+    ``account_type``, ``persona`` and ``model`` each take a name or a list
+    of names; ``filter`` is any extra pyarrow.dataset expression. The
+    filter is pushed into the scan: partitions of a ``partition_by`` export
+    that can't match are never opened, and row groups whose statistics rule
+    them out are skipped. ``columns`` limits which columns are read at all.
+    Returns a DataFrame, or an Arrow Table with ``as_pandas=False``.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(
+        path,
+        format="parquet",
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+    )
+    expression = filter
+    for name, value in (
+        ("account_type", account_type),
+        ("persona", persona),
+        ("model", model),
+    ):
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else list(value)
+        condition = ds.field(name).isin(values)
+        expression = condition if expression is None else expression & condition
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas() if as_pandas else table
+
+
+def split_posts_arrow(posts):
+    """Columnar split_posts() over an Arrow string array.
+
+    Returns ``(parents, posts)``: the split posts and, for each one, the index
+    of the response it came from. Gives the same posts as calling
+    split_posts() on every element.
+    """
+    import pyarrow.compute as pc
+
+    parts = pc.split_pattern(posts, "\n\n")
+    parents = pc.list_parent_indices(parts)
+    flat = pc.utf8_trim_whitespace(pc.list_flatten(parts))
+    keep = pc.and_(
+        pc.greater(pc.utf8_length(flat), 0),
+        pc.invert(pc.match_substring_regex(flat, "^-+$")),
+    )
+    return pc.filter(parents, keep), pc.filter(flat, keep)
+
+
+def responses_table(responses: list, categorical: bool = False):
+    """One Arrow row per raw response: metadata columns plus the raw text.
+
+    Structured-output records, which already hold a list of posts, have a
+    null ``posts`` and their posts in an extra ``post_list`` column.
+    """
+    columns = {
+        "user_id": [v["id"] for v in responses],
+        "account_type": [v["account"]["account_type"] for v in responses],
+        "persona": [v["account"]["persona"] for v in responses],
+        "model": [v["model"] for v in responses],
+    }
+    for name in MODIFIER_COLUMNS:
+        columns[name] = [v["account"]["modifiers"].get(name) for v in responses]
+    columns["posts"] = [
+        v["posts"] if isinstance(v["posts"], str) else None for v in responses
+    ]
+    if not all(isinstance(v["posts"], str) for v in responses):
+        columns["post_list"] = [
+            v["posts"] if isinstance(v["posts"], list) else None for v in responses
+        ]
+    return response_columns_table(columns, categorical)
+
+
+def response_columns_table(columns: dict, categorical: bool = False):
+    """responses_table() from its columns, given as lists or Arrow arrays."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = dict(columns)
+    post_list = columns.pop("post_list", None)
+    schema = string_schema(list(columns), categorical)
+    if categorical:
+        from catalog import get_catalog
+
+        catalog = get_catalog()
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if not isinstance(values, pa.Array):
+            values = pa.array(values, pa.string())
+        if not pa.types.is_dictionary(field.type):
+            arrays.append(values)
+            continue
+        if field.name in ("account_type", "persona") or field.name in MODIFIER_COLUMNS:
+            # Catalog codes as the dictionary indices, so ids are the same in
+            # every row group and every export
+            labels = pa.array(catalog.labels(field.name), pa.string())
+            codes = pc.index_in(values, value_set=labels)
+            if codes.null_count == values.null_count:
+                arrays.append(pa.DictionaryArray.from_arrays(codes, labels))
+                continue
+        # Not a catalog column, or names the catalog doesn't know
+        arrays.append(values.dictionary_encode())
+    table = pa.Table.from_arrays(arrays, schema=schema)
+    if post_list is not None:
+        if not isinstance(post_list, pa.Array):
+            post_list = pa.array(post_list, pa.list_(pa.string()))
+        table = table.append_column("post_list", post_list)
+    return table
+
+
+def response_tables(db, chunk_size: int, categorical: bool = False):
+    """responses_table() chunks for a whole store.
+
+    Segment stores (segments.py) build them straight from their Arrow
+    columns; posts.db goes through the decoded records.
+    """
+    if hasattr(db, "responses_tables"):
+        return db.responses_tables(chunk_size, categorical)
+    return (
+        responses_table(chunk, categorical)
+        for chunk in iter_chunks(db.values(), chunk_size)
+    )
+
+
+def explode_posts(responses):
+    """Turn a responses_table() into one row per post (POST_COLUMNS).
+
+    Metadata is repeated with ``take`` on the parent indices instead of
+    copying a dict per post.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    parents, posts = split_posts_arrow(responses.column("posts"))
+    if "post_list" in responses.column_names:
+        # Merge in the structured records' posts, keeping response order
+        lists = responses.column("post_list")
+        parents = pa.chunked_array(
+            [*parents.chunks, *pc.list_parent_indices(lists).chunks]
+        )
+        posts = pa.chunked_array([*posts.chunks, *pc.list_flatten(lists).chunks])
+        order = pc.sort_indices(parents)
+        parents, posts = parents.take(order), posts.take(order)
+        responses = responses.drop_columns(["post_list"])
+    table = responses.drop_columns(["posts"]).take(parents)
+    return table.append_column("post", posts)
+
+
+def _write_posts_streaming(
+    tables,
+    output_path: str,
+    categorical: bool,
+    compression: str,
+    row_group_size: int,
+    dedup: str | None = None,
+    duplicates: tuple | None = None,
+    partition_by: list | None = None,
+) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # The schema has to be fixed before the first row group, so every
+    # modifier column is present and null where it doesn't apply
+    schema = string_schema(POST_COLUMNS, categorical)
+    if dedup == "flag":
+        schema = schema.append(pa.field("duplicate_of", pa.int64()))
+    n_posts = 0
+
+    def post_tables():
+        nonlocal n_posts
+        for responses in tables:
+            table = explode_posts(responses)
+            if duplicates:
+                index, report = duplicates
+                duplicate_of = index.add(table["post"].to_pylist())
+                report.add(
+                    table["persona"].to_pylist(),
+                    table["model"].to_pylist(),
+                    duplicate_of,
+                )
+                if dedup == "drop":
+                    table = table.filter(pa.array(duplicate_of < 0))
+                else:
+                    table = table.append_column(
+                        "duplicate_of", pa.array(duplicate_of, mask=duplicate_of < 0)
+                    )
+            n_posts += table.num_rows
+            yield table
+
+    if partition_by:
+        _write_partitioned(
+            post_tables(),
+            schema,
+            output_path,
+            partition_by,
+            compression,
+            row_group_size,
+        )
+        return n_posts
+    with pq.ParquetWriter(output_path, schema, compression=compression) as writer:
+        for table in post_tables():
+            writer.write_table(table, row_group_size=row_group_size)
+    return n_posts
+
+
+def _write_partitioned(
+    tables,
+    schema,
+    output_path: str,
+    partition_by: list,
+    compression: str,
+    row_group_size: int,
+):
+    """Write tables as a Hive-partitioned Parquet dataset under output_path."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    def by_persona(table):
+        # Sorting doesn't take dictionary columns; their codes group just as well
+        persona = table["persona"].combine_chunks()
+        if pa.types.is_dictionary(persona.type):
+            persona = persona.indices
+        return table.take(pc.sort_indices(persona))
+
+    # One open file per partition across all chunks, rather than a file per
+    # partition per chunk, with each persona's rows together in a row group
+    batches = (batch for table in tables for batch in by_persona(table).to_batches())
+    ds.write_dataset(
+        batches,
+        output_path,
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([schema.field(name) for name in partition_by]), flavor="hive"
+        ),
+        file_options=ds.ParquetFileFormat().make_write_options(compression=compression),
+        min_rows_per_group=row_group_size,
+        max_rows_per_group=row_group_size,
+        existing_data_behavior="delete_matching",
+    )
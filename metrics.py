@@ -0,0 +1,239 @@
+"""Per-model generation metrics.
+
+``GenerationMetrics`` rolls structured per-request stats (tokens from
+``response.usage``, latency, posts and their length) up into live counters
+per model: tokens/sec, posts per GPU-hour and errors. It prints as a
+periodic summary and, with ``serve()``, as a Prometheus text endpoint.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+
+
+@dataclass
+class StreamStats:
+    """Timings for one streamed response."""
+
+    ttft: float  # seconds from request to first content token
+    seconds: float  # seconds from request to last token
+    tokens: int | None  # None when the server didn't report usage
+    posts: int
+    stopped_early: bool = False
+    prompt_tokens: int | None = None
+
+    @property
+    def tokens_per_second(self) -> float:
+        decode = self.seconds - self.ttft
+        return self.tokens / decode if self.tokens and decode > 0 else 0.0
+
+
+@dataclass
+class StreamTotals:
+    requests: int = 0
+    ttft: float = 0.0
+    seconds: float = 0.0
+    tokens: int = 0
+    token_seconds: float = 0.0  # decode time of the streams with token counts
+    posts: int = 0
+    stopped_early: int = 0
+
+
+class StreamMetrics:
+    """Time to first token, tokens/sec and time per post, rolled up per model."""
+
+    def __init__(self):
+        self.totals = defaultdict(StreamTotals)
+
+    def record(self, model: str, stats: StreamStats):
+        t = self.totals[model]
+        t.requests += 1
+        t.ttft += stats.ttft
+        t.seconds += stats.seconds
+        if stats.tokens is not None:
+            t.tokens += stats.tokens
+            t.token_seconds += stats.seconds - stats.ttft
+        t.posts += stats.posts
+        t.stopped_early += stats.stopped_early
+
+    def summary(self) -> dict:
+        out = {}
+        for model, t in self.totals.items():
+            out[model] = {
+                "requests": t.requests,
+                "avg_ttft": t.ttft / t.requests,
+                "tokens_per_second": t.tokens / t.token_seconds
+                if t.token_seconds > 0
+                else 0.0,
+                "seconds_per_post": t.seconds / t.posts if t.posts else 0.0,
+                "stopped_early": t.stopped_early,
+            }
+        return out
+
+    def report(self) -> str:
+        lines = []
+        for model, s in self.summary().items():
+            lines.append(
+                f"{model}: TTFT {s['avg_ttft']:.2f}s, "
+                f"{s['tokens_per_second']:.1f} tokens/s per stream, "
+                f"{s['seconds_per_post']:.2f}s per post, "
+                f"{s['stopped_early']}/{s['requests']} stopped early"
+            )
+        return "\n".join(lines)
+
+
+@dataclass
+class RequestStats:
+    """One successful request."""
+
+    model: str
+    seconds: float
+    prompt_tokens: int
+    completion_tokens: int
+    posts: int
+    post_chars: int
+
+    @property
+    def avg_post_length(self) -> float:
+        return self.post_chars / self.posts if self.posts else 0.0
+
+
+@dataclass
+class ModelTotals:
+    requests: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    posts: int = 0
+    post_chars: int = 0
+    # Recent latencies for percentiles
+    latencies: deque = field(default_factory=lambda: deque(maxlen=10_000))
+
+
+class GenerationMetrics:
+    """Live per-model counters built from RequestStats.
+
+    Rates are over wall-clock time since the metrics were created. Each
+    endpoint is taken to be one GPU unless ``gpus`` maps its model to a
+    count, so posts per GPU-hour compares models on cost.
+    """
+
+    def __init__(self, gpus: dict | None = None):
+        self.gpus = gpus or {}
+        self.started = time.monotonic()
+        self.totals = defaultdict(ModelTotals)
+        self.lock = threading.Lock()
+        self.server = None
+
+    def record(self, stats: RequestStats):
+        with self.lock:
+            t = self.totals[stats.model]
+            t.requests += 1
+            t.seconds += stats.seconds
+            t.prompt_tokens += stats.prompt_tokens
+            t.completion_tokens += stats.completion_tokens
+            t.posts += stats.posts
+            t.post_chars += stats.post_chars
+            t.latencies.append(stats.seconds)
+
+    def record_error(self, model: str):
+        with self.lock:
+            self.totals[model].errors += 1
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        out = {}
+        with self.lock:
+            for model, t in self.totals.items():
+                latencies = sorted(t.latencies)
+                attempts = t.requests + t.errors
+                gpu_hours = elapsed / 3600 * self.gpus.get(model, 1)
+                out[model] = {
+                    "requests": t.requests,
+                    "errors": t.errors,
+                    "error_rate": t.errors / attempts if attempts else 0.0,
+                    "prompt_tokens": t.prompt_tokens,
+                    "completion_tokens": t.completion_tokens,
+                    "tokens_per_second": t.completion_tokens / elapsed,
+                    "posts": t.posts,
+                    "posts_per_gpu_hour": t.posts / gpu_hours if gpu_hours else 0.0,
+                    "avg_post_length": t.post_chars / t.posts if t.posts else 0.0,
+                    "avg_latency": t.seconds / t.requests if t.requests else 0.0,
+                    "p50_latency": _percentile(latencies, 50),
+                    "p99_latency": _percentile(latencies, 99),
+                }
+        return out
+
+    def report(self) -> str:
+        lines = []
+        for model, s in self.summary().items():
+            lines.append(
+                f"{model}: {s['requests']} requests ({s['errors']} errors), "
+                f"{s['tokens_per_second']:.1f} tokens/s, "
+                f"{s['posts_per_gpu_hour']:.0f} posts/GPU-hour, "
+                f"p50 {s['p50_latency']:.2f}s, p99 {s['p99_latency']:.2f}s, "
+                f"{s['avg_post_length']:.0f} chars/post"
+            )
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """The summary in Prometheus text exposition format."""
+        metrics = [
+            ("requests", "counter", "Successful requests"),
+            ("errors", "counter", "Failed request attempts"),
+            ("prompt_tokens", "counter", "Prompt tokens"),
+            ("completion_tokens", "counter", "Completion tokens"),
+            ("posts", "counter", "Posts extracted"),
+            ("tokens_per_second", "gauge", "Completion tokens per second"),
+            ("posts_per_gpu_hour", "gauge", "Posts per GPU-hour"),
+            ("avg_post_length", "gauge", "Average post length in characters"),
+            ("p50_latency", "gauge", "Median request latency in seconds"),
+            ("p99_latency", "gauge", "99th percentile request latency in seconds"),
+        ]
+        summary = self.summary()
+        lines = []
+        for name, kind, help_text in metrics:
+            metric = f"synthetic_posts_{name}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for model, s in summary.items():
+                label = model.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{metric}{{model="{label}"}} {s[name]}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9100, host: str = "127.0.0.1"):
+        """Serve ``/metrics`` from a background thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
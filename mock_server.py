@@ -0,0 +1,377 @@
+"""Local stand-in for an OpenAI-compatible ``/v1/chat/completions`` endpoint.
+
+Serves made-up posts with a configurable time to first token, decode rate
+and error mix, so generate_posts(), generate_posts_async() and the export
+can be benchmarked without GPUs. Supports ``n``, ``max_tokens``, streaming
+(with ``stream_options={"include_usage": True}``), ``usage`` counts, and
+structured output through ``response_format`` or a forced tool call.
+
+    python mock_server.py --port 8000 --ttft 0.2 --tokens-per-second 60
+
+or in-process::
+
+    with MockServer(MockConfig(error_rate=0.05)) as server:
+        asyncio.run(generate_posts_async(configs=server.configs(), ...))
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = [
+    "the",
+    "a",
+    "to",
+    "and",
+    "of",
+    "my",
+    "just",
+    "so",
+    "this",
+    "is",
+    "why",
+    "we",
+    "you",
+    "lol",
+    "omg",
+    "new",
+    "deal",
+    "today",
+    "again",
+    "love",
+    "hate",
+    "coffee",
+    "work",
+    "weekend",
+    "news",
+    "update",
+    "thread",
+    "honestly",
+]
+TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+@dataclass
+class MockConfig:
+    latency: str = "lognormal"  # time to first token: fixed, uniform or lognormal
+    ttft: float = 0.05  # median seconds (the upper bound for uniform)
+    ttft_sigma: float = 0.5  # lognormal shape
+    tokens_per_second: float = 2000.0  # decode rate per response
+    posts: int = 28
+    min_words: int = 5
+    max_words: int = 40
+    error_rate: float = 0.0  # share of requests answered with a 500
+    rate_limit_rate: float = 0.0  # share answered with a 429 and Retry-After
+    retry_after: float = 1.0
+    seed: int | None = None
+
+
+class MockStats:
+    """Server-side counts and per-request latencies (receipt to last byte)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = 0
+            self.completion_tokens = 0
+            self.latencies = []
+
+    def record(self, seconds: float, tokens: int = 0, error: bool = False):
+        with self.lock:
+            self.requests += 1
+            self.errors += error
+            self.completion_tokens += tokens
+            self.latencies.append(seconds)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json(200, {"object": "list", "data": [{"id": "mock"}]})
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        received = time.perf_counter()
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        config, rng = self.server.config, self.server.rng
+        with self.server.rng_lock:
+            roll = rng.random()
+            ttft = self._ttft(config, rng)
+            posts = [self._posts(config, rng) for _ in range(body.get("n") or 1)]
+            response_id = f"chatcmpl-{rng.getrandbits(64):x}"
+
+        if roll < config.error_rate + config.rate_limit_rate:
+            time.sleep(ttft)
+            if roll < config.error_rate:
+                self._json(500, {"error": {"message": "injected server error"}})
+            else:
+                self._json(
+                    429,
+                    {"error": {"message": "injected rate limit"}},
+                    {"Retry-After": str(config.retry_after)},
+                )
+            self.server.stats.record(time.perf_counter() - received, error=True)
+            return
+
+        tool = None
+        if body.get("tools"):
+            tool = body["tools"][0]["function"]["name"]
+            texts = [json.dumps({"posts": p}) for p in posts]
+        elif (body.get("response_format") or {}).get("type") in (
+            "json_schema",
+            "json_object",
+        ):
+            texts = [json.dumps({"posts": p}) for p in posts]
+        else:
+            texts = ["Here are some posts:\n\n" + "\n\n".join(p) for p in posts]
+        tokens = [TOKEN.findall(text) for text in texts]
+        limit = body.get("max_tokens") or body.get("max_completion_tokens")
+        truncated = [bool(limit and len(t) > limit) for t in tokens]
+        if limit:
+            tokens = [t[:limit] for t in tokens]
+        prompt_tokens = sum(
+            len(str(m.get("content", ""))) // 4 for m in body.get("messages", [])
+        )
+        completion_tokens = sum(len(t) for t in tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        reasons = [
+            "length" if t else ("tool_calls" if tool else "stop") for t in truncated
+        ]
+        base = {
+            "id": response_id,
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+        }
+
+        time.sleep(ttft)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            self._stream(base, tokens, reasons, usage if include_usage else None, tool)
+        else:
+            # n responses decode side by side, as on a batching server
+            time.sleep(max(len(t) for t in tokens) / config.tokens_per_second)
+            self._json(
+                200,
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": i,
+                            "message": self._message("".join(t), tool),
+                            "finish_reason": reasons[i],
+                        }
+                        for i, t in enumerate(tokens)
+                    ],
+                    "usage": usage,
+                },
+            )
+        self.server.stats.record(time.perf_counter() - received, completion_tokens)
+
+    @staticmethod
+    def _ttft(config: MockConfig, rng: random.Random) -> float:
+        if config.latency == "fixed":
+            return config.ttft
+        if config.latency == "uniform":
+            return rng.uniform(0, config.ttft)
+        return rng.lognormvariate(0, config.ttft_sigma) * config.ttft
+
+    @staticmethod
+    def _posts(config: MockConfig, rng: random.Random) -> list:
+        return [
+            " ".join(
+                rng.choices(WORDS, k=rng.randint(config.min_words, config.max_words))
+            )
+            for _ in range(config.posts)
+        ]
+
+    @staticmethod
+    def _message(text: str, tool: str | None) -> dict:
+        if tool is None:
+            return {"role": "assistant", "content": text}
+        call = {
+            "id": "call_0",
+            "type": "function",
+            "function": {"name": tool, "arguments": text},
+        }
+        return {"role": "assistant", "content": None, "tool_calls": [call]}
+
+    def _json(self, status: int, payload: dict, headers: dict | None = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(
+        self,
+        base: dict,
+        tokens: list,
+        reasons: list,
+        usage: dict | None,
+        tool: str | None = None,
+    ):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload):
+            data = b"data: " + payload + b"\n\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        def chunk(choices, **extra):
+            payload = {**base, "object": "chat.completion.chunk", "choices": choices}
+            send(json.dumps({**payload, **extra}).encode())
+
+        def delta(text, first):
+            if tool is None:
+                return {"content": text}
+            call = {"index": 0, "function": {"arguments": text}}
+            if first:
+                call.update(id="call_0", type="function")
+                call["function"]["name"] = tool
+            return {"tool_calls": [call]}
+
+        # Flush roughly every 10ms rather than sleeping per token
+        rate = self.server.config.tokens_per_second
+        step = max(1, int(rate * 0.01))
+        try:
+            for start in range(0, max(len(t) for t in tokens), step):
+                choices = [
+                    {
+                        "index": i,
+                        "delta": delta("".join(t[start : start + step]), start == 0),
+                        "finish_reason": None,
+                    }
+                    for i, t in enumerate(tokens)
+                    if start < len(t)
+                ]
+                chunk(choices)
+                self.wfile.flush()
+                time.sleep(step / rate)
+            chunk(
+                [
+                    {"index": i, "delta": {}, "finish_reason": reason}
+                    for i, reason in enumerate(reasons)
+                ]
+            )
+            if usage:
+                chunk([], usage=usage)
+            send(b"[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early (max_posts)
+            self.close_connection = True
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class MockServer:
+    """The mock endpoint on a background thread; ``port=0`` picks a free port."""
+
+    def __init__(
+        self, config: MockConfig | None = None, host: str = "127.0.0.1", port: int = 0
+    ):
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.config = self.config
+        self.httpd.stats = self.stats
+        self.httpd.rng = random.Random(self.config.seed)
+        self.httpd.rng_lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def configs(self, models: int = 1, **options) -> dict:
+        """MODEL_CONFIGS-style entries that all point at this server."""
+        return {
+            f"mock-{i}": {
+                "host_url": self.url,
+                "model": f"mock-{i}",
+                "api_key": "not-needed",
+                **options,
+            }
+            for i in range(models)
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal"
+    )
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--posts", type=int, default=28)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    config = MockConfig(
+        latency=args.latency,
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        posts=args.posts,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    server = MockServer(config, args.host, args.port)
+    print(f"Serving mock completions on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
@@ -0,0 +1,111 @@
+"""Plan exactly the requests needed to hit target counts per cell.
+
+Independent ``sample_account()`` draws only approach the ACCOUNT_DATA
+weights on average, so getting a target count for every
+(account_type, persona, model) cell means over-generating. ``QuotaPlanner``
+takes the target count per cell, subtracts what is already in posts.db and
+emits exactly the missing jobs, shuffled so every endpoint stays busy.
+Modifiers come from the compiled catalog (catalog.accounts_for()), so a
+seeded schedule is the same every time.
+"""
+
+import random
+from collections import Counter
+
+from generate_posts import ACCOUNT_DATA, MODEL_CONFIGS, new_job
+
+
+def split_evenly(total: int, keys: list) -> dict:
+    """Split an integer total across keys, spreading the remainder."""
+    base, extra = divmod(total, len(keys))
+    return {key: base + (i < extra) for i, key in enumerate(keys)}
+
+
+def targets_from_weights(total: int, configs: dict | None = None) -> dict:
+    """Target responses per (account_type, persona, model) cell.
+
+    Account types get ``total`` in proportion to their ACCOUNT_DATA weight
+    (largest remainder, so the counts add up to ``total``), then split evenly
+    over personas and models.
+    """
+    configs = configs or MODEL_CONFIGS
+    models = [config["model"] for config in configs.values()]
+    weight_sum = sum(data["weight"] for data in ACCOUNT_DATA.values())
+    shares = {
+        name: total * data["weight"] / weight_sum for name, data in ACCOUNT_DATA.items()
+    }
+    per_type = {name: int(share) for name, share in shares.items()}
+    by_remainder = sorted(shares, key=lambda n: shares[n] - per_type[n], reverse=True)
+    for name in by_remainder[: total - sum(per_type.values())]:
+        per_type[name] += 1
+
+    targets = {}
+    for account_type, type_total in per_type.items():
+        personas = ACCOUNT_DATA[account_type]["personas"]
+        for persona, persona_total in split_evenly(type_total, personas).items():
+            for model, n in split_evenly(persona_total, models).items():
+                targets[(account_type, persona, model)] = n
+    return targets
+
+
+def count_cells(records) -> Counter:
+    """Responses per (account_type, persona, model) in an iterable of records."""
+    counts = Counter()
+    for record in records:
+        account = record["account"]
+        counts[(account["account_type"], account["persona"], record["model"])] += 1
+    return counts
+
+
+class QuotaPlanner:
+    def __init__(
+        self,
+        targets: dict,
+        existing: Counter | None = None,
+        configs: dict | None = None,
+    ):
+        configs = configs or MODEL_CONFIGS
+        self.config_keys = {config["model"]: key for key, config in configs.items()}
+        existing = existing or Counter()
+        for account_type, persona, model in targets:
+            if model not in self.config_keys:
+                raise ValueError(f"No config for model {model!r}")
+            if persona not in ACCOUNT_DATA[account_type]["personas"]:
+                raise ValueError(f"Unknown persona {persona!r} for {account_type!r}")
+        self.targets = targets
+        self.remaining = {
+            cell: max(n - existing.get(cell, 0), 0) for cell, n in targets.items()
+        }
+
+    @classmethod
+    def from_store(cls, targets: dict, db_path: str = "posts.db", **kwargs):
+        """Planner that only asks for what posts.db doesn't already have."""
+        import os
+
+        from store import open_reader
+
+        existing = Counter()
+        if os.path.exists(db_path):
+            db = open_reader(db_path)
+            existing = count_cells(db.values())
+            db.close()
+        return cls(targets, existing, **kwargs)
+
+    def __len__(self) -> int:
+        return sum(self.remaining.values())
+
+    def schedule(self, seed: int | None = None) -> list:
+        """Exactly the missing jobs, shuffled, each with its own request id.
+
+        The same ``seed`` gives the same order and the same accounts.
+        """
+        from catalog import accounts_for
+
+        rng = random.Random(seed)
+        cells = [cell for cell, n in self.remaining.items() for _ in range(n)]
+        rng.shuffle(cells)
+        accounts = accounts_for([cell[:2] for cell in cells], seed)
+        return [
+            new_job(account, self.config_keys[model])
+            for account, (_, _, model) in zip(accounts, cells)
+        ]
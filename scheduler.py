@@ -0,0 +1,268 @@
+"""Pick which endpoint gets the next request.
+
+``random.choice`` over MODEL_CONFIGS sends the same traffic to a 7B and a
+72B model, so the slow endpoints queue up while the fast ones sit idle.
+``LoadBalancer`` tracks live latency, error rate and in-flight requests per
+endpoint and picks each request's endpoint at random, weighted by how fast
+that endpoint is expected to finish it (``1 / expected_wait``). Faster
+endpoints get a proportionally larger share, but every endpoint keeps
+getting work, whether requests go out one at a time or many at once. With a
+``target_mix`` it instead steers the share of requests per endpoint towards
+the given fractions, e.g. ``{"Qwen/Qwen2.5-72B-Instruct": 0.4, ...}``.
+
+Each endpoint also has a circuit breaker: after ``failure_threshold``
+consecutive failures it is taken out of rotation for ``cooldown`` seconds,
+then a single probe request is let through. A success closes the circuit,
+a failure opens it again for twice as long (up to ``max_cooldown``).
+``start()`` refuses requests the breaker doesn't admit, so callers that
+waited out ``ready_in()`` have to choose again; only the first one gets
+the probe.
+"""
+
+import random
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class EndpointStats:
+    limit: int
+    in_flight: int = 0
+    started: int = 0
+    completed: int = 0
+    errors: int = 0
+    latency: float | None = None  # exponentially weighted, seconds
+    error_rate: float = 0.0  # exponentially weighted
+    consecutive_failures: int = 0
+    open_until: float | None = None  # circuit breaker, time.monotonic()
+    cooldown: float = 0.0
+    probe_started: float | None = None  # the half-open circuit's probe, in flight
+
+    def accepting(self, now: float) -> bool:
+        if self.open_until is None:
+            return self.in_flight < self.limit
+        # Half-open once the cooldown has passed: one probe at a time
+        return (
+            now >= self.open_until
+            and self.probe_started is None
+            and self.in_flight == 0
+        )
+
+    def expected_wait(self) -> float:
+        """Rough time until a new request here would finish."""
+        if self.latency is None:
+            return 0.0  # untried endpoints go first so we learn their latency
+        success = max(1.0 - self.error_rate, 0.05)
+        return self.latency * (1 + self.in_flight / self.limit) / success
+
+
+class LoadBalancer:
+    # How often a request waiting on another request's probe checks again
+    probe_wait = 1.0
+
+    def __init__(
+        self,
+        configs: dict,
+        per_endpoint_limit: int = 16,
+        target_mix: dict | None = None,
+        alpha: float = 0.2,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        max_cooldown: float = 600.0,
+    ):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.stats = {
+            key: EndpointStats(limit=config.get("max_concurrency", per_endpoint_limit))
+            for key, config in configs.items()
+        }
+        self.target_mix = None
+        if target_mix:
+            unknown = set(target_mix) - set(configs)
+            if unknown:
+                raise ValueError(f"target_mix has unknown endpoints: {sorted(unknown)}")
+            total = sum(target_mix.values())
+            self.target_mix = {key: target_mix.get(key, 0) / total for key in configs}
+
+    def available(self) -> list:
+        """Endpoints that can take a request now.
+
+        Falls back to endpoints that are merely full, then to every endpoint,
+        so there is always a choice; ready_in() says how long to wait.
+        """
+        now = time.monotonic()
+        keys = [k for k, s in self.stats.items() if s.accepting(now)]
+        closed = [k for k, s in self.stats.items() if s.open_until is None]
+        return keys or closed or list(self.stats)
+
+    def ready_in(self, key: str) -> float:
+        """Seconds until the endpoint's circuit may let a request through."""
+        stats = self.stats[key]
+        if stats.open_until is None:
+            return 0.0
+        now = time.monotonic()
+        if now < stats.open_until:
+            return stats.open_until - now
+        # Half-open: free now, unless another request has the probe
+        return 0.0 if stats.accepting(now) else self.probe_wait
+
+    def choose(self) -> str:
+        keys = self.available()
+        if self.target_mix:
+            # Furthest below its target share of the requests started so far
+            total = sum(s.started for s in self.stats.values()) + 1
+            keys = [k for k in keys if self.target_mix[k] > 0] or keys
+            return max(
+                keys,
+                key=lambda k: (
+                    self.target_mix[k] * total - self.stats[k].started,
+                    random.random(),
+                ),
+            )
+        untried = [k for k in keys if self.stats[k].latency is None]
+        if untried:
+            # Learn every endpoint's latency before weighting by it
+            return random.choice(untried)
+        weights = [1 / max(self.stats[k].expected_wait(), 1e-6) for k in keys]
+        return random.choices(keys, weights)[0]
+
+    def start(self, key: str) -> float | None:
+        """Count a request as started; None if the circuit breaker refuses it.
+
+        A closed circuit takes every request (callers queue for their own
+        concurrency limit). An open one takes nothing until its cooldown has
+        passed, then only the one probe, whose start time passed back to
+        finish() identifies it.
+        """
+        stats = self.stats[key]
+        now = time.monotonic()
+        if stats.open_until is not None:
+            if not stats.accepting(now):
+                return None
+            stats.probe_started = now
+        stats.in_flight += 1
+        stats.started += 1
+        return now
+
+    def finish(self, key: str, started_at: float, ok: bool = True):
+        stats = self.stats[key]
+        stats.in_flight -= 1
+        probe = stats.probe_started is not None and started_at == stats.probe_started
+        if probe:
+            stats.probe_started = None
+        stats.error_rate += self.alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+        if not ok:
+            stats.errors += 1
+            stats.consecutive_failures += 1
+            now = time.monotonic()
+            if stats.open_until is not None:
+                # Requests that started before the circuit opened don't count
+                if probe:
+                    # The probe failed, back off for longer
+                    stats.cooldown = min(stats.cooldown * 2, self.max_cooldown)
+                    stats.open_until = now + stats.cooldown
+            elif stats.consecutive_failures >= self.failure_threshold:
+                stats.cooldown = self.base_cooldown
+                stats.open_until = now + stats.cooldown
+            return
+        stats.completed += 1
+        stats.consecutive_failures = 0
+        stats.open_until = None
+        latency = time.monotonic() - started_at
+        if stats.latency is None:
+            stats.latency = latency
+        else:
+            stats.latency += self.alpha * (latency - stats.latency)
+
+    def report(self) -> str:
+        lines = []
+        for key, s in self.stats.items():
+            latency = f"{s.latency:.1f}s" if s.latency is not None else "n/a"
+            circuit = " (circuit open)" if s.open_until is not None else ""
+            lines.append(
+                f"{key}: {s.completed} done, {s.in_flight} in flight, "
+                f"{s.errors} errors, latency {latency}{circuit}"
+            )
+        return "\n".join(lines)
+
+
+@dataclass
+class RetryPolicy:
+    """Bounded retries with full-jitter exponential backoff."""
+
+    attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def __post_init__(self):
+        if self.attempts < 1:
+            raise ValueError(f"attempts must be at least 1, got {self.attempts}")
+
+    def delay(self, attempt: int) -> float:
+        """Sleep before retry number ``attempt`` (1 for the first retry)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+def request_errors() -> tuple:
+    """Exceptions a request can fail with: API errors, dropped streams and
+    the per-request deadline (``TimeoutError`` from ``asyncio.timeout``).
+
+    Anything else is a bug and should propagate rather than be stored as a
+    failed request.
+    """
+    import httpx
+    import openai
+
+    return (openai.APIError, httpx.HTTPError, TimeoutError)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, dropped connections and streams, 429s and 5xx are worth
+    retrying."""
+    import httpx
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True  # APITimeoutError is an APIConnectionError
+    if isinstance(error, httpx.TransportError):
+        return True  # a stream cut off mid-response, e.g. by a restarting server
+    if isinstance(error, TimeoutError):
+        return True  # the per-request deadline
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def batch_by_prefix(
+    jobs, batch_size: int = 8, configs: dict | None = None, window: int = 10_000
+):
+    """Reorder jobs so accounts sharing a prompt prefix go out together.
+
+    Jobs with the same account type and persona share the start of their
+    system prompt. Within each ``window`` of jobs, those are grouped into
+    batches of ``batch_size``, and every batch is pinned to one endpoint so
+    the batch lands on the same server while its prefix is cached. Each job
+    still gets its own temperature from build_request(). Jobs that were
+    already pinned stay on their endpoint.
+    """
+    from itertools import cycle, islice
+
+    from generate_posts import MODEL_CONFIGS
+
+    endpoints = cycle(list(configs or MODEL_CONFIGS))
+    jobs = iter(jobs)
+    while True:
+        chunk = list(islice(jobs, window))
+        if not chunk:
+            return
+        groups = {}
+        for job in chunk:
+            key = (job.account["account_type"], job.account["persona"], job.config_key)
+            groups.setdefault(key, []).append(job)
+        for (_, _, config_key), group in groups.items():
+            for i in range(0, len(group), batch_size):
+                endpoint = config_key or next(endpoints)
+                for job in group[i : i + batch_size]:
+                    yield job._replace(config_key=endpoint)
@@ -0,0 +1,308 @@
+"""Append-only raw store in rotating Arrow IPC segments.
+
+An alternative to posts.db for big runs: a directory named ``*.segments``
+holding Arrow IPC stream files, one record batch per flush. Closed segments
+are never modified, so several processes can scan them at once, and readers
+memory-map them so columns are read without copying or unpickling. Failed
+requests go to ``failures.jsonl``.
+
+Each writer session starts its own segment (named by start time, pid and a
+random token, so concurrent writers don't collide) and rotates to a new one every
+``segment_rows`` records. A crash loses at most the unflushed buffer: a
+torn trailing batch is skipped on read. Re-running a job appends a new row
+with the same id; readers keep the one with the latest ``written_at`` stamp,
+which holds across concurrent writers where segment order doesn't.
+
+    migrate("posts.db", "posts.segments")
+    generate_posts_async(db_path="posts.segments", ...)
+    format_data_set(db_path="posts.segments", ...)
+"""
+
+import json
+import os
+import time
+import uuid
+
+import pyarrow as pa
+from pyarrow import ipc
+
+from store import SEGMENT_SUFFIX, PostWriter, StoreReader
+
+RAW_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("model", pa.string()),
+        ("account_type", pa.string()),
+        ("persona", pa.string()),
+        ("modifiers", pa.map_(pa.string(), pa.string())),
+        ("temperature", pa.float64()),
+        ("prompt_tokens", pa.int64()),
+        ("completion_tokens", pa.int64()),
+        # Raw response text, or null with the posts in post_list for
+        # structured-output records
+        ("posts", pa.string()),
+        ("post_list", pa.list_(pa.string())),
+        # time.time_ns() at flush, plus the row's position in the flush
+        ("written_at", pa.int64()),
+    ]
+)
+
+
+def records_to_batch(records: list) -> pa.RecordBatch:
+    columns = {name: [] for name in RAW_SCHEMA.names}
+    for r in records:
+        account = r["account"]
+        usage = r.get("usage") or {}
+        posts = r["posts"]
+        columns["id"].append(r["id"])
+        columns["model"].append(r["model"])
+        columns["account_type"].append(account["account_type"])
+        columns["persona"].append(account["persona"])
+        columns["modifiers"].append(list(account["modifiers"].items()))
+        columns["temperature"].append(r.get("temperature"))
+        columns["prompt_tokens"].append(usage.get("prompt_tokens"))
+        columns["completion_tokens"].append(usage.get("completion_tokens"))
+        columns["posts"].append(posts if isinstance(posts, str) else None)
+        columns["post_list"].append(posts if isinstance(posts, list) else None)
+    now = time.time_ns()
+    columns["written_at"] = [now + i for i in range(len(records))]
+    return pa.RecordBatch.from_pydict(columns, schema=RAW_SCHEMA)
+
+
+def row_to_record(row: dict) -> dict:
+    """A segment row back in the posts.db record shape."""
+    record = {
+        "model": row["model"],
+        "id": row["id"],
+        "posts": row["posts"] if row["post_list"] is None else row["post_list"],
+        "account": {
+            "account_type": row["account_type"],
+            "persona": row["persona"],
+            "modifiers": dict(row["modifiers"]),
+        },
+    }
+    if row["temperature"] is not None:
+        record["temperature"] = row["temperature"]
+    if row["prompt_tokens"] is not None:
+        record["usage"] = {
+            "prompt_tokens": row["prompt_tokens"],
+            "completion_tokens": row["completion_tokens"],
+        }
+    return record
+
+
+class SegmentWriter(PostWriter):
+    """PostWriter (same buffering and background flushes) over segments."""
+
+    def __init__(
+        self,
+        path: str = "posts" + SEGMENT_SUFFIX,
+        batch_size: int = 256,
+        flush_interval: float = 2.0,
+        segment_rows: int = 100_000,
+    ):
+        self.segment_rows = segment_rows
+        super().__init__(path, batch_size, flush_interval)
+
+    def _open(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segment = 0
+        self.token = uuid.uuid4().hex[:8]
+        self.sink = self.writer = None
+        self.segment_written = 0
+        self.failures_path = os.path.join(path, "failures.jsonl")
+
+    def _rotate(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+        # Time first so names sort oldest to newest; pid and a per-writer
+        # token so concurrent writers, even in one process, never collide
+        name = (
+            f"{time.time_ns() // 1_000_000:013d}-{os.getpid()}-{self.token}"
+            f"-{self.segment:04d}"
+        )
+        self.segment += 1
+        self.sink = pa.OSFile(os.path.join(self.path, name + ".arrows"), "wb")
+        self.writer = ipc.new_stream(self.sink, RAW_SCHEMA)
+        self.segment_written = 0
+
+    def _write_records(self, records: list):
+        # A flush can be bigger than what's left of the segment, split it
+        while records:
+            if self.writer is None or self.segment_written >= self.segment_rows:
+                self._rotate()
+            room = self.segment_rows - self.segment_written
+            batch, records = records[:room], records[room:]
+            self.writer.write_batch(records_to_batch(batch))
+            self.segment_written += len(batch)
+
+    def _write_failures(self, records: list):
+        # Failures are rare, so the log is only open while writing to it
+        with open(self.failures_path, "a") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+    def _close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+
+
+class SegmentStore:
+    """Read side of a segment directory, memory-mapped."""
+
+    def __init__(self, path: str = "posts" + SEGMENT_SUFFIX):
+        self.path = path
+
+    def segments(self) -> list:
+        return sorted(
+            os.path.join(self.path, name)
+            for name in os.listdir(self.path)
+            if name.endswith(".arrows")
+        )
+
+    @staticmethod
+    def read_segment(path: str, columns: list | None = None) -> pa.Table:
+        """Every complete batch in one segment, zero-copy from the mmap."""
+        batches = []
+        with pa.memory_map(path) as source:
+            try:
+                reader = ipc.open_stream(source)
+                while True:
+                    batches.append(reader.read_next_batch())
+            except StopIteration:
+                pass
+            except (pa.ArrowInvalid, OSError):
+                # Torn last batch from a crashed writer, or an empty file
+                pass
+        table = pa.Table.from_batches(batches, RAW_SCHEMA)
+        return table.select(columns) if columns else table
+
+    def read_table(self, columns: list | None = None, latest: bool = True):
+        """All rows as one Table; ``latest`` drops rows a later one replaced."""
+        chunks = list(self.chunks(columns, latest=latest))
+        if not chunks:
+            return RAW_SCHEMA.empty_table().select(columns or RAW_SCHEMA.names)
+        return pa.concat_tables(chunks)
+
+    def chunks(
+        self, columns: list | None = None, chunk_size: int = 10_000, latest: bool = True
+    ):
+        """Tables of up to ``chunk_size`` rows, one segment at a time.
+
+        Chunks are slices of the memory map; only one that drops replaced
+        rows (``latest``) is copied, so memory stays bounded by the chunk.
+        """
+        segments = self.segments()
+        masks = self._latest_masks(segments) if latest else None
+        for i, path in enumerate(segments):
+            table = self.read_segment(path, columns)
+            if masks is not None:
+                # Rows a writer appended since the masks were built wait
+                # for the next read
+                table = table.slice(0, len(masks[i]))
+            for offset in range(0, table.num_rows, chunk_size):
+                chunk = table.slice(offset, chunk_size)
+                if masks is not None:
+                    keep = masks[i].slice(offset, chunk_size)
+                    if keep.false_count:
+                        chunk = chunk.filter(keep)
+                if chunk.num_rows:
+                    yield chunk
+
+    def _latest_masks(self, segments: list) -> list | None:
+        """Per segment, which rows are their id's latest write.
+
+        Built from the ``id`` and ``written_at`` columns only; None when no
+        id repeats, so nothing needs filtering.
+        """
+        import pyarrow.compute as pc
+
+        tables = [self.read_segment(path, ["id", "written_at"]) for path in segments]
+        if not tables:
+            return None
+        ids = pa.chunked_array([t["id"] for t in tables], pa.string())
+        if pc.count_distinct(ids).as_py() == len(ids):
+            return None
+        stamps = pa.chunked_array([t["written_at"] for t in tables], pa.int64())
+        latest = {}
+        for i, (id, written_at) in enumerate(zip(ids.to_pylist(), stamps.to_pylist())):
+            if id not in latest or written_at >= latest[id][0]:
+                latest[id] = (written_at, i)
+        keep = [False] * len(ids)
+        for _, i in latest.values():
+            keep[i] = True
+        masks, offset = [], 0
+        for table in tables:
+            masks.append(pa.array(keep[offset : offset + table.num_rows]))
+            offset += table.num_rows
+        return masks
+
+    def responses_tables(self, chunk_size: int = 10_000, categorical: bool = False):
+        """generate_posts.responses_table() chunks built from the columns,
+        without turning rows into records."""
+        import pyarrow.compute as pc
+
+        from generate_posts import MODIFIER_COLUMNS, response_columns_table
+
+        for chunk in self.chunks(chunk_size=chunk_size):
+            # One batch per chunk; copies only if it spans several flushes
+            batch = chunk.combine_chunks().to_batches()[0]
+            columns = {
+                "user_id": batch["id"],
+                "account_type": batch["account_type"],
+                "persona": batch["persona"],
+                "model": batch["model"],
+            }
+            for name in MODIFIER_COLUMNS:
+                columns[name] = pc.map_lookup(batch["modifiers"], name, "first")
+            columns["posts"] = batch["posts"]
+            if batch["post_list"].null_count < batch.num_rows:
+                columns["post_list"] = batch["post_list"]
+            yield response_columns_table(columns, categorical)
+
+    def keys(self):
+        return self.read_table(["id"], latest=False)["id"].unique().to_pylist()
+
+    def values(self, batch_size: int = 10_000):
+        """Records in the posts.db shape, latest version of each id."""
+        for chunk in self.chunks(chunk_size=batch_size):
+            for row in chunk.to_pylist():
+                yield row_to_record(row)
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def close(self):
+        pass
+
+
+def migrate(
+    db_path: str = "posts.db",
+    path: str = "posts" + SEGMENT_SUFFIX,
+    segment_rows: int = 100_000,
+    batch_size: int = 10_000,
+) -> dict:
+    """Copy every record and failure from posts.db into a segment store.
+
+    Both tables are streamed through StoreReader, one row at a time.
+    """
+    n_failures = 0
+    with SegmentWriter(path, batch_size=batch_size, segment_rows=segment_rows) as w:
+        db = StoreReader(db_path)
+        try:
+            for record in db.values():
+                w.write(record)
+            has_failures = "failures" in db.tablenames()
+        finally:
+            db.close()
+        if has_failures:
+            failures = StoreReader(db_path, tablename="failures")
+            try:
+                for record in failures.values():
+                    w.write_failure(record)
+                    n_failures += 1
+            finally:
+                failures.close()
+    return {"records": w.written, "failures": n_failures}
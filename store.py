@@ -0,0 +1,385 @@
+"""Raw response store (posts.db) helpers.
+
+Records are written as JSON text rather than pickles. Older databases full
+of pickled blobs still read fine: ``decode_record`` tells the two apart by
+the SQLite value type.
+
+A path ending in ``.segments`` is an Arrow IPC segment store instead (see
+segments.py); ``open_writer()`` and ``open_reader()`` pick the backend from
+the path.
+"""
+
+import json
+import pickle
+import threading
+import time
+
+
+def encode_record(record: dict) -> str:
+    return json.dumps(record)
+
+
+def decode_record(value) -> dict:
+    if isinstance(value, (bytes, memoryview)):
+        # Written by SqliteDict's default pickle encoder
+        return pickle.loads(bytes(value))
+    return json.loads(value)
+
+
+def open_store(
+    path: str = "posts.db",
+    flag: str = "c",
+    autocommit: bool = False,
+    journal_mode: str = "WAL",
+    tablename: str = "unnamed",
+):
+    """Open posts.db as a SqliteDict using the JSON record encoding.
+
+    Responses live in the default table, failed requests in ``failures``.
+    """
+    from sqlitedict import SqliteDict
+
+    return SqliteDict(
+        path,
+        tablename=tablename,
+        flag=flag,
+        autocommit=autocommit,
+        journal_mode=journal_mode,
+        encode=encode_record,
+        decode=decode_record,
+    )
+
+
+SEGMENT_SUFFIX = ".segments"
+
+
+def is_segment_store(path: str) -> bool:
+    return path.rstrip("/\\").endswith(SEGMENT_SUFFIX)
+
+
+def open_writer(path: str = "posts.db", **options):
+    """PostWriter for posts.db, SegmentWriter for a .segments directory."""
+    if is_segment_store(path):
+        from segments import SegmentWriter
+
+        return SegmentWriter(path, **options)
+    return PostWriter(path, **options)
+
+
+def open_reader(path: str = "posts.db"):
+    """Read-only store with ``keys()``, ``values()`` and ``close()``."""
+    if is_segment_store(path):
+        from segments import SegmentStore
+
+        return SegmentStore(path)
+    return StoreReader(path)
+
+
+class StoreReader:
+    """Read-only posts.db that streams rows through a plain sqlite3 cursor.
+
+    SqliteDict's iterators run the query on a worker thread that queues up
+    the entire result, so reading a big DB with them needs memory for all of
+    it. Iterating here holds one row at a time, in rowid (insertion) order.
+    """
+
+    def __init__(self, path: str = "posts.db", tablename: str = "unnamed"):
+        import sqlite3
+
+        self.tablename = tablename
+        # pyarrow's dataset writer pulls batches on its own thread; the
+        # connection is only ever read from one thread at a time.
+        self.conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    def _column(self, column: str):
+        cursor = self.conn.execute(
+            f'SELECT {column} FROM "{self.tablename}" ORDER BY rowid'
+        )
+        for (value,) in cursor:
+            yield value
+
+    def keys(self):
+        return self._column("key")
+
+    def values(self):
+        return (decode_record(value) for value in self._column("value"))
+
+    def items(self):
+        cursor = self.conn.execute(
+            f'SELECT key, value FROM "{self.tablename}" ORDER BY rowid'
+        )
+        for key, value in cursor:
+            yield key, decode_record(value)
+
+    def __len__(self) -> int:
+        (count,) = self.conn.execute(
+            f'SELECT COUNT(*) FROM "{self.tablename}"'
+        ).fetchone()
+        return count
+
+    def tablenames(self) -> list:
+        """Every table in the file, e.g. to check for ``failures``."""
+        rows = self.conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        return [name for (name,) in rows]
+
+    def count(self, tablename: str) -> int:
+        """Row count of another table in the same file."""
+        (count,) = self.conn.execute(f'SELECT COUNT(*) FROM "{tablename}"').fetchone()
+        return count
+
+    def close(self):
+        self.conn.close()
+
+
+class PostWriter:
+    """Write-behind writer for posts.db.
+
+    ``write()`` only appends to an in-memory buffer. A background thread
+    commits the buffer in one transaction once it holds ``batch_size``
+    records or ``flush_interval`` seconds have passed, whichever comes first.
+    Use it as a context manager so the buffer is flushed on exit, including
+    the KeyboardInterrupt raised by Ctrl-C. Requests that failed for good go
+    through ``write_failure()`` into the ``failures`` table.
+
+    If a background flush fails (a locked or full disk, say) its records go
+    back in the buffer, the thread stops and the error is raised from the
+    next ``write()`` or ``write_failure()``. ``close()`` still makes one last
+    attempt to flush the buffer and raises if that fails too.
+    """
+
+    def __init__(
+        self,
+        path: str = "posts.db",
+        batch_size: int = 256,
+        flush_interval: float = 2.0,
+    ):
+        self._open(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._buffer = []
+        self._failed = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _open(self, path: str):
+        self.db = open_store(path)
+        self.failures = open_store(path, tablename="failures")
+
+    def _write_records(self, records: list):
+        self.db.update((record["id"], record) for record in records)
+        self.db.commit()
+
+    def _write_failures(self, records: list):
+        self.failures.update((record["id"], record) for record in records)
+        self.failures.commit()
+
+    def _close(self):
+        self.db.close()
+        self.failures.close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, record: dict):
+        self._raise_error()
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def write_failure(self, record: dict):
+        self._raise_error()
+        with self._lock:
+            self._failed.append(record)
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            failed, self._failed = self._failed, []
+        try:
+            if batch:
+                self._write_records(batch)
+                self.written += len(batch)
+                batch = []
+            if failed:
+                self._write_failures(failed)
+        except BaseException:
+            # Keep what didn't make it to disk for the next flush
+            with self._lock:
+                self._buffer[:0] = batch
+                self._failed[:0] = failed
+            raise
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            with self._lock:
+                pending = len(self._buffer) + len(self._failed)
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if pending >= self.batch_size or (pending and due):
+                try:
+                    self.flush()
+                except Exception as e:  # noqa: BLE001 - raised on the caller's thread
+                    self._error = e
+                    return
+                last_flush = time.monotonic()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self.flush()
+        finally:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def manifest_path(db_path: str) -> str:
+    """posts.db -> posts.jobs.db"""
+    import os
+
+    return os.path.splitext(db_path)[0] + ".jobs.db"
+
+
+class JobManifest:
+    """Planned requests and their status, kept next to posts.db.
+
+    Every job gets its request id up front and that id becomes the record
+    id in posts.db, so re-running a job overwrites rather than duplicates.
+    posts.db is the source of truth for what finished: ``pending()`` returns
+    every planned job whose record isn't in the store yet, which covers jobs
+    that were never started, were in flight, or failed when the process died.
+
+    Status changes are buffered and committed together once ``batch_size``
+    are waiting or ``flush_interval`` seconds have passed, so tracking costs
+    one commit per batch rather than a few per request. Losing the last few
+    on a crash is harmless since ``pending()`` goes by posts.db.
+    """
+
+    STATUSES = ("planned", "in_flight", "done", "failed")
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 2.0):
+        import sqlite3
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._ops = []
+        self._last_flush = time.monotonic()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                account TEXT NOT NULL,
+                config_key TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated REAL NOT NULL
+            )"""
+        )
+        self.conn.commit()
+
+    def add(self, jobs, commit: bool = True):
+        """Record jobs as planned. Jobs already in the manifest are left alone.
+
+        Committed right away unless ``commit=False``, which buffers them with
+        the status changes.
+        """
+        now = time.time()
+        self._queue(
+            "INSERT OR IGNORE INTO jobs (id, account, config_key, status, updated) "
+            "VALUES (?, ?, ?, 'planned', ?)",
+            [(job.id, json.dumps(job.account), job.config_key, now) for job in jobs],
+        )
+        if commit:
+            self.flush()
+
+    def _queue(self, sql: str, rows: list):
+        self._ops.append((sql, rows))
+        due = time.monotonic() - self._last_flush >= self.flush_interval
+        if len(self._ops) >= self.batch_size or due:
+            self.flush()
+
+    def flush(self):
+        """Commit every buffered change in one transaction."""
+        ops, self._ops = self._ops, []
+        self._last_flush = time.monotonic()
+        if not ops:
+            return
+        with self.conn:
+            for sql, rows in ops:
+                self.conn.executemany(sql, rows)
+
+    def pending(self, db_path: str) -> list:
+        """Jobs without a record in posts.db; the rest are marked done."""
+        import os
+
+        from generate_posts import Job
+
+        self.flush()
+        stored = set()
+        if os.path.exists(db_path):
+            db = open_reader(db_path)
+            stored = set(db.keys())
+            db.close()
+        rows = self.conn.execute(
+            "SELECT id, account, config_key, status FROM jobs ORDER BY rowid"
+        ).fetchall()
+        finished = [(row[0],) for row in rows if row[0] in stored and row[3] != "done"]
+        self.conn.executemany("UPDATE jobs SET status = 'done' WHERE id = ?", finished)
+        self.conn.commit()
+        return [
+            Job(json.loads(account), config_key, id)
+            for id, account, config_key, status in rows
+            if id not in stored
+        ]
+
+    def _set(self, id: str, status: str, error: str | None = None):
+        attempts = ", attempts = attempts + 1" if status == "in_flight" else ""
+        self._queue(
+            f"UPDATE jobs SET status = ?, error = ?, updated = ?{attempts} "
+            "WHERE id = ?",
+            [(status, error, time.time(), id)],
+        )
+
+    def started(self, id: str):
+        self._set(id, "in_flight")
+
+    def done(self, id: str):
+        self._set(id, "done")
+
+    def failed(self, id: str, error: str):
+        self._set(id, "failed", error)
+
+    def summary(self) -> dict:
+        self.flush()
+        counts = dict(
+            self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        )
+        return {status: counts.get(status, 0) for status in self.STATUSES}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
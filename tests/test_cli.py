@@ -0,0 +1,76 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from generate_posts import Job, make_failure, make_record, sample_account
+from store import open_writer
+
+# Fails if stats pulls in anything it doesn't need
+STATS = """
+import sys
+from cli import main
+main(sys.argv[1:])
+heavy = {"sqlitedict", "pandas", "pyarrow", "openai"} & set(sys.modules)
+assert not heavy, heavy
+"""
+
+
+def stats(*args):
+    return subprocess.run(
+        [sys.executable, "-c", STATS, "stats", *args],
+        capture_output=True,
+        text=True,
+        check=False,
+        cwd=Path(__file__).parent.parent,
+    )
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "posts.db")
+    with open_writer(path) as writer:
+        for model in ["m1", "m1", "m2"]:
+            writer.write(make_record(model, "one\n\ntwo", sample_account()))
+        job = Job(sample_account(), None, "failed-1")
+        writer.write_failure(make_failure(job, "m2", TimeoutError(), 4))
+    return path
+
+
+def test_stats(db_path):
+    result = stats("--db", db_path, "--json")
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout)
+    assert summary["responses"] == 3
+    assert summary["posts"] == 6
+    assert summary["failures"] == 1
+    assert summary["models"]["m1"] == {"responses": 2, "posts": 4}
+
+
+def test_stats_missing_db(tmp_path):
+    result = stats("--db", str(tmp_path / "missing.db"))
+    assert result.returncode == 2
+    assert "no such store" in result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_sync_rejects_async_only_flags(capsys):
+    from cli import main
+
+    with pytest.raises(SystemExit) as exc:
+        main(["generate", "--sync", "--stream", "--max-in-flight", "8"])
+    assert exc.value.code == 2
+    assert "--sync doesn't support --max-in-flight, --stream" in capsys.readouterr().err
+
+
+def test_sync_mock_run_stops_after_num_requests(tmp_path):
+    from cli import main
+
+    db_path = str(tmp_path / "posts.db")
+    main(["generate", "--sync", "--mock", "--num-requests", "3", "--db", db_path])
+    result = stats("--db", db_path, "--json")
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout)
+    assert summary["responses"] + summary["failures"] == 3
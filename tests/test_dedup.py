@@ -0,0 +1,50 @@
+import pytest
+
+from dedup import NearDuplicateFilter
+from generate_posts import format_data_set, make_record, sample_account
+from store import open_writer
+
+POSTS = [
+    "just finished my morning run and the sunrise over the lake was amazing",
+    "Just finished my morning run and the sunrise over the lake was amazing!!",
+    "new blog post up about sourdough starters and why mine keeps dying",
+    "limited offer click the link now to claim your free crypto reward today",
+]
+
+
+def test_filter_matches_across_chunks():
+    index = NearDuplicateFilter(threshold=0.8)
+    assert index.add(POSTS[:3]).tolist() == [-1, 0, -1]
+    # Indexes are global, so a later chunk points back into the first
+    assert index.add([POSTS[3], POSTS[2].upper()]).tolist() == [-1, 2]
+    assert dict(index.clusters) == {0: 1, 2: 1}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_export_flags_and_drops_duplicates(tmp_path, streaming):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    db_path = str(tmp_path / "posts.db")
+    with open_writer(db_path) as writer:
+        writer.write(make_record("m1", "\n\n".join(POSTS[:3]), sample_account()))
+        writer.write(make_record("m2", "\n\n".join(POSTS[2:]), sample_account()))
+    options = {"streaming": streaming, "chunk_size": 1, "db_path": db_path}
+
+    flagged = str(tmp_path / "flagged.parquet")
+    format_data_set(output_path=flagged, dedup="flag", **options)
+    table = pq.read_table(flagged)
+    assert table.column("duplicate_of").to_pylist() == [None, 0, None, 2, None]
+
+    dropped = str(tmp_path / "dropped.parquet")
+    format_data_set(output_path=dropped, dedup="drop", **options)
+    assert pq.read_table(dropped).column("post").to_pylist() == [
+        POSTS[0],
+        POSTS[2],
+        POSTS[3],
+    ]
+
+
+def test_parallel_signatures_match():
+    posts = [f"{post} {i}" for i in range(2_500) for post in POSTS]
+    serial = NearDuplicateFilter().signatures(posts)
+    assert (NearDuplicateFilter(workers=2).signatures(posts) == serial).all()
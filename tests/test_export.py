@@ -0,0 +1,91 @@
+import random
+
+from generate_posts import format_data_set, load_posts, make_record, sample_account
+from store import open_writer
+
+
+def write_db(path, n: int) -> int:
+    rng = random.Random(0)
+    posts = 0
+    with open_writer(str(path)) as writer:
+        for i in range(n):
+            k = rng.randint(1, 5)
+            posts += k
+            text = "\n\n".join(f"post {i}.{j}" for j in range(k))
+            writer.write(make_record(rng.choice(["m1", "m2"]), text, sample_account()))
+    return posts
+
+
+def test_streaming_partitioned_export(tmp_path):
+    db_path = tmp_path / "posts.db"
+    posts = write_db(db_path, 300)
+    output = tmp_path / "posts"
+    written = format_data_set(
+        streaming=True,
+        chunk_size=64,
+        db_path=str(db_path),
+        output_path=str(output),
+        partition_by=["account_type", "model"],
+    )
+    assert written == posts
+
+    table = load_posts(str(output), as_pandas=False)
+    assert table.num_rows == posts
+    bots = load_posts(str(output), account_type="bot", as_pandas=False)
+    assert bots.num_rows == sum(
+        1 for value in table.column("account_type").to_pylist() if value == "bot"
+    )
+    assert set(table.column("model").to_pylist()) == {"m1", "m2"}
+
+
+def test_append_export_and_compaction_keep_regenerated_records(tmp_path):
+    import pyarrow.parquet as pq
+
+    from export import compact_export, export_new, read_state
+
+    db_path = str(tmp_path / "posts.db")
+    output = str(tmp_path / "posts")
+    accounts = {str(i): sample_account() for i in range(3)}
+    with open_writer(db_path) as writer:
+        for id, account in accounts.items():
+            writer.write(make_record("m1", f"old {id}\n\nsecond", account, id))
+    assert export_new(db_path, output)["posts"] == 6
+    assert export_new(db_path, output)["part"] is None
+
+    # Regenerate one response and add a new one
+    with open_writer(db_path) as writer:
+        writer.write(make_record("m2", "new 1", accounts["1"], "1"))
+        writer.write(make_record("m2", "new 3", sample_account(), "3"))
+    result = export_new(db_path, output)
+    assert (result["responses"], result["posts"]) == (2, 2)
+    assert result["part"] == read_state(output)["parts"][1]["file"]
+    assert pq.read_table(output).num_rows == 8
+
+    assert compact_export(output) == {"parts": 2, "posts": 6}
+    table = pq.read_table(output)
+    posts = sorted(zip(table["user_id"].to_pylist(), table["post"].to_pylist()))
+    assert posts == [
+        ("0", "old 0"),
+        ("0", "second"),
+        ("1", "new 1"),
+        ("2", "old 2"),
+        ("2", "second"),
+        ("3", "new 3"),
+    ]
+    assert len(read_state(output)["parts"]) == 1
+
+
+def test_parallel_export_matches_streaming_order(tmp_path):
+    import pyarrow.parquet as pq
+
+    db_path = tmp_path / "posts.db"
+    posts = write_db(db_path, 200)
+    single = str(tmp_path / "single.parquet")
+    format_data_set(streaming=True, db_path=str(db_path), output_path=single)
+    parallel = str(tmp_path / "parallel")
+    result = format_data_set(db_path=str(db_path), output_path=parallel, workers=3)
+    assert result == {"responses": 200, "posts": posts, "parts": 3}
+
+    columns = ["user_id", "post"]
+    expected = pq.read_table(single, columns=columns).to_pylist()
+    assert pq.read_table(parallel, columns=columns).to_pylist() == expected
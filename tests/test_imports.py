@@ -0,0 +1,11 @@
+from bench import bench_import_time
+
+MODULES = ("cli", "generate_posts", "store", "workers")
+
+
+def test_imports_are_fast_and_light():
+    results = bench_import_time(MODULES, repeat=3)
+    for module, result in results.items():
+        assert result["heavy_imports"] == [], module
+        # Generous bound: these take ~20-50ms, pandas alone takes ~300ms
+        assert result["seconds"] < 0.25, (module, result["seconds"])
@@ -0,0 +1,51 @@
+import urllib.request
+
+from generate_posts import request_stats
+from metrics import GenerationMetrics
+
+
+def metrics_for_two_models() -> GenerationMetrics:
+    metrics = GenerationMetrics({"big": 4})
+    metrics.record(request_stats("big", 2.0, ["one\n\ntwo"], 100, 40))
+    metrics.record(request_stats("big", 4.0, ["three"], 100, 20))
+    metrics.record_error("big")
+    metrics.record(request_stats('odd "name"', 1.0, [["a", "bb"]], 10, 5))
+    return metrics
+
+
+def test_summary_per_model():
+    summary = metrics_for_two_models().summary()
+    big = summary["big"]
+    assert (big["requests"], big["errors"], big["posts"]) == (2, 1, 3)
+    assert (big["prompt_tokens"], big["completion_tokens"]) == (200, 60)
+    assert big["error_rate"] == 1 / 3
+    assert big["avg_latency"] == 3.0
+    assert big["avg_post_length"] == len("onetwothree") / 3
+    assert summary['odd "name"']["posts"] == 2
+
+
+def test_prometheus_exposition():
+    text = metrics_for_two_models().prometheus()
+    lines = text.splitlines()
+    assert "# TYPE synthetic_posts_requests_total counter" in lines
+    assert "# TYPE synthetic_posts_p99_latency gauge" in lines
+    assert 'synthetic_posts_requests_total{model="big"} 2' in lines
+    assert 'synthetic_posts_errors_total{model="big"} 1' in lines
+    assert 'synthetic_posts_posts_total{model="odd \\"name\\""} 2' in lines
+    # Every sample line is "name{labels} value"
+    for line in lines:
+        if not line.startswith("#"):
+            float(line.rsplit(" ", 1)[1])
+
+
+def test_serves_metrics_endpoint():
+    metrics = metrics_for_two_models()
+    server = metrics.serve(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            body = response.read().decode()
+    finally:
+        metrics.close()
+    assert 'synthetic_posts_requests_total{model="big"} 2' in body.splitlines()
@@ -0,0 +1,111 @@
+import json
+import random
+
+import pytest
+
+from generate_posts import JsonPostParser, PostSplitter, split_posts
+
+TEXTS = [
+    "Here are some posts:\n\nfirst post\n\nsecond\nwith a line\n\n---\n\nthird\n",
+    "no separators at all",
+    "\n\n\n\nleading gaps\n\n\n\n",
+]
+DOCUMENTS = [
+    json.dumps({"posts": ["one", 'with "quotes"', "multi\n\nparagraph", "é 🎉"]}),
+    json.dumps({"posts": ["\\backslash\\", "tab\tand\nnewline", "  padded  "]}),
+    '{"posts": ["bad \\q escape", "ok"]}',
+    '{"posts": []}',
+    '{ "posts" : [ "spaced" , "out" ] }',
+]
+
+
+def pieces(text: str, rng: random.Random, longest: int = 5):
+    i = 0
+    while i < len(text):
+        j = i + rng.randint(1, longest)
+        yield text[i:j]
+        i = j
+
+
+def split_stream(text: str, chunks) -> list:
+    splitter = PostSplitter()
+    posts = []
+    for chunk in chunks:
+        posts += splitter.feed(chunk)
+    return posts + splitter.finish()
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_post_splitter_every_boundary(text):
+    expected = split_posts(text)
+    for cut in range(len(text) + 1):
+        assert split_stream(text, [text[:cut], text[cut:]]) == expected
+    assert split_stream(text, text) == expected
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_post_splitter_random_chunks(text):
+    rng = random.Random(0)
+    for _ in range(50):
+        assert split_stream(text, pieces(text, rng)) == split_posts(text)
+
+
+def parse_stream(text: str, chunks) -> JsonPostParser:
+    parser = JsonPostParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.finish()
+    return parser
+
+
+@pytest.mark.parametrize("text", DOCUMENTS)
+def test_json_parser_every_boundary(text):
+    whole = JsonPostParser.parse(text)
+    for cut in range(len(text) + 1):
+        assert parse_stream(text, [text[:cut], text[cut:]]).posts == whole
+    assert parse_stream(text, text).posts == whole
+    rng = random.Random(0)
+    for _ in range(50):
+        assert parse_stream(text, pieces(text, rng)).posts == whole
+
+
+def test_json_parser_decodes_posts():
+    assert JsonPostParser.parse(DOCUMENTS[0]) == [
+        "one",
+        'with "quotes"',
+        "multi\n\nparagraph",
+        "é 🎉",
+    ]
+
+
+def test_json_parser_keeps_invalid_escapes():
+    assert JsonPostParser.parse(DOCUMENTS[2]) == ["bad \\q escape", "ok"]
+
+
+def test_json_parser_escaped_emoji_next_to_invalid_escape():
+    pa = pytest.importorskip("pyarrow")
+
+    text = r'{"posts": ["party \ud83c\udf89 \q", "half \ud83c an emoji"]}'
+    posts = JsonPostParser.parse(text)
+    assert posts == ["party 🎉 \\q", "half \ufffd an emoji"]
+    # Stored as UTF-8, which a lone surrogate can't be
+    assert pa.array(posts).to_pylist() == posts
+
+
+def test_json_parser_empty_array_is_found():
+    parser = parse_stream(DOCUMENTS[3], [DOCUMENTS[3]])
+    assert parser.found
+    assert parser.posts == []
+
+
+def test_json_parser_not_json():
+    parser = parse_stream(
+        "Here are [some] posts:\n\na", ["Here are [some] posts:\n\na"]
+    )
+    assert not parser.found
+
+
+def test_json_parser_truncated_keeps_finished_posts():
+    text = '{"posts": ["done", "also done", "cut of'
+    parser = parse_stream(text, [text])
+    assert parser.posts == ["done", "also done"]
@@ -0,0 +1,48 @@
+import pytest
+
+from catalog import sample_accounts
+from generate_posts import (
+    MODEL_CONFIGS,
+    OUTPUT_FORMATS,
+    PROMPT_LAYOUTS,
+    build_request,
+    generate_system_prompt,
+)
+
+
+@pytest.mark.parametrize("layout", PROMPT_LAYOUTS)
+@pytest.mark.parametrize("output_format", OUTPUT_FORMATS)
+def test_catalog_prompts_match(layout, output_format):
+    batch = sample_accounts(200, seed=1)
+    for i in range(len(batch)):
+        assert batch.system_prompt(i, layout, output_format) == (
+            generate_system_prompt(batch.account(i), layout, output_format)
+        )
+
+
+@pytest.mark.parametrize("output_format", ["json", "tool"])
+def test_structured_prompts_drop_text_format(output_format):
+    account = sample_accounts(1, seed=0).account(0)
+    config = next(iter(MODEL_CONFIGS.values()))
+    request = build_request(config, account, output_format=output_format)
+    system = request["messages"][0]["content"]
+    assert "double newlines" not in system
+    assert '"posts" array' in system
+    text = build_request(config, account)["messages"][0]["content"]
+    assert len(system) < len(text)
+
+
+def test_catalog_compiles_its_own_account_data():
+    from catalog import Catalog
+    from generate_posts import MODIFIER_COLUMNS
+
+    catalog = Catalog(
+        {
+            "custom": {"weight": 1, "personas": ["p1"], "modifiers": {"foo": ["a"]}},
+            "bare": {"weight": 1, "personas": ["p2"]},
+        }
+    )
+    assert catalog.categories == ("foo",)
+    assert catalog.labels("foo") == ("a",)
+    assert catalog.counts.tolist() == [[1], [0]]
+    assert Catalog().categories == tuple(MODIFIER_COLUMNS)
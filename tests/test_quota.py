@@ -0,0 +1,20 @@
+from generate_posts import ACCOUNT_DATA
+from quota import QuotaPlanner, targets_from_weights
+
+
+def test_seeded_schedule_is_repeatable():
+    planner = QuotaPlanner(targets_from_weights(300))
+    first, second = planner.schedule(seed=1), planner.schedule(seed=1)
+    assert len(first) == 300
+    assert [(j.account, j.config_key) for j in first] == [
+        (j.account, j.config_key) for j in second
+    ]
+    for job in first:
+        data = ACCOUNT_DATA[job.account["account_type"]]
+        assert job.account["persona"] in data["personas"]
+        assert set(job.account["modifiers"]) == set(data["modifiers"])
+    assert first[0].id != second[0].id
+
+
+def test_empty_schedule():
+    assert QuotaPlanner({}).schedule(seed=0) == []
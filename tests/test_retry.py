@@ -0,0 +1,78 @@
+import pytest
+
+from generate_posts import MODEL_CONFIGS, RequestAttempts, new_job, sample_account
+from metrics import GenerationMetrics
+from scheduler import LoadBalancer, RetryPolicy
+
+
+def attempts_for(retry: RetryPolicy, config_key=None) -> RequestAttempts:
+    metrics = GenerationMetrics({c["model"]: 1 for c in MODEL_CONFIGS.values()})
+    return RequestAttempts(
+        new_job(sample_account(), config_key),
+        LoadBalancer(MODEL_CONFIGS),
+        retry,
+        metrics,
+        MODEL_CONFIGS,
+    )
+
+
+def run(attempts: RequestAttempts, errors: list) -> list:
+    """Drive the attempt loop, failing with ``errors`` in turn."""
+    keys = []
+    while attempts.backoff() is not None:
+        attempts.choose()
+        attempts.start()
+        keys.append(attempts.config_key)
+        if errors:
+            attempts.failed(errors.pop(0))
+            continue
+        attempts.succeeded()
+    return keys
+
+
+def test_attempts_must_be_positive():
+    with pytest.raises(ValueError):
+        RetryPolicy(attempts=0)
+
+
+def test_success_after_retries():
+    httpx = pytest.importorskip("httpx")
+    import openai
+
+    request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+    error = openai.APIConnectionError(request=request)
+    attempts = attempts_for(RetryPolicy(attempts=4, base_delay=0))
+    assert len(run(attempts, [error, error])) == 3
+    assert attempts.ok
+
+
+def test_gives_up_after_last_attempt():
+    httpx = pytest.importorskip("httpx")
+    import openai
+
+    request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+    key = next(iter(MODEL_CONFIGS))
+    attempts = attempts_for(RetryPolicy(attempts=3, base_delay=0), key)
+    errors = [openai.APIConnectionError(request=request) for _ in range(5)]
+    # A pinned job stays on its endpoint for every attempt
+    assert run(attempts, errors) == [key] * 3
+    assert not attempts.ok
+    failure = attempts.failure()
+    assert failure["attempts"] == 3
+    assert failure["model"] == MODEL_CONFIGS[key]["model"]
+
+
+def test_no_retry_on_permanent_errors():
+    attempts = attempts_for(RetryPolicy(attempts=4, base_delay=0))
+    assert len(run(attempts, [ValueError("bad request")])) == 1
+    assert attempts.failure()["attempts"] == 1
+
+
+@pytest.mark.parametrize("error", ["ReadError", "RemoteProtocolError", "ReadTimeout"])
+def test_dropped_streams_are_retried(error):
+    httpx = pytest.importorskip("httpx")
+
+    dropped = getattr(httpx, error)("stream closed")
+    attempts = attempts_for(RetryPolicy(attempts=4, base_delay=0))
+    assert len(run(attempts, [dropped, dropped])) == 3
+    assert attempts.ok
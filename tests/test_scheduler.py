@@ -0,0 +1,68 @@
+import random
+import time
+from collections import Counter
+
+from scheduler import LoadBalancer
+
+LATENCIES = {"7B": 0.001, "14B": 0.002, "32B": 0.004, "72B": 0.008}
+
+
+def run_serial(balancer: LoadBalancer, n: int) -> Counter:
+    """One request at a time, each taking its endpoint's latency."""
+    counts = Counter()
+    for _ in range(n):
+        key = balancer.choose()
+        balancer.start(key)
+        balancer.finish(key, time.monotonic() - LATENCIES[key])
+        counts[key] += 1
+    return counts
+
+
+def test_serial_mix_follows_throughput():
+    random.seed(0)
+    balancer = LoadBalancer({key: {} for key in LATENCIES})
+    counts = run_serial(balancer, 3000)
+    # Expected shares are 8:4:2:1 of 15
+    total = sum(LATENCIES[k] ** -1 for k in LATENCIES)
+    for key, latency in LATENCIES.items():
+        share = counts[key] / 3000
+        assert abs(share - latency**-1 / total) < 0.05, (key, share)
+    assert min(counts.values()) > 100
+
+
+def test_target_mix_is_kept():
+    random.seed(0)
+    mix = {"7B": 1, "14B": 1, "32B": 1, "72B": 1}
+    balancer = LoadBalancer({key: {} for key in LATENCIES}, target_mix=mix)
+    counts = run_serial(balancer, 200)
+    assert set(counts.values()) == {50}
+
+
+def test_half_open_circuit_admits_one_probe():
+    balancer = LoadBalancer({"7B": {}}, failure_threshold=1, cooldown=0.0)
+    balancer.finish("7B", balancer.start("7B"), ok=False)
+    assert balancer.stats["7B"].open_until is not None
+    # Six requests waited out the cooldown; only the first gets through
+    started = [balancer.start("7B") for _ in range(6)]
+    assert started[0] is not None
+    assert started[1:] == [None] * 5
+    assert balancer.ready_in("7B") == balancer.probe_wait
+    balancer.finish("7B", started[0])
+    assert balancer.start("7B") is not None
+
+
+def test_only_a_failed_probe_backs_off():
+    balancer = LoadBalancer({"7B": {}}, failure_threshold=1, cooldown=0.01)
+    stats = balancer.stats["7B"]
+    first, stuck = balancer.start("7B"), balancer.start("7B")
+    balancer.finish("7B", first, ok=False)
+    open_until = stats.open_until
+    time.sleep(0.02)
+    # Started before the circuit opened, so it isn't the probe
+    balancer.finish("7B", stuck, ok=False)
+    assert (stats.cooldown, stats.open_until) == (0.01, open_until)
+    probe = balancer.start("7B")
+    assert probe is not None
+    balancer.finish("7B", probe, ok=False)
+    assert stats.cooldown == 0.02
+    assert stats.probe_started is None
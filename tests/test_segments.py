@@ -0,0 +1,65 @@
+from generate_posts import Job, make_failure, make_record, sample_account
+from segments import SegmentStore, SegmentWriter, migrate
+from store import open_writer
+
+
+def test_migrate_rotates_within_a_flush(tmp_path):
+    db_path = str(tmp_path / "posts.db")
+    with open_writer(db_path) as writer:
+        for i in range(300):
+            writer.write(make_record("m", f"post {i}", sample_account(), str(i)))
+        job = Job(sample_account(), None, "failed-1")
+        writer.write_failure(make_failure(job, "m", TimeoutError(), 4))
+
+    path = str(tmp_path / "posts.segments")
+    assert migrate(db_path, path, segment_rows=100) == {
+        "records": 300,
+        "failures": 1,
+    }
+    store = SegmentStore(path)
+    sizes = [store.read_segment(p).num_rows for p in store.segments()]
+    assert sizes == [100, 100, 100]
+    assert len(store) == 300
+    with open(tmp_path / "posts.segments" / "failures.jsonl") as f:
+        assert len(f.readlines()) == 1
+
+
+def test_small_flushes_fill_segments(tmp_path):
+    path = str(tmp_path / "posts.segments")
+    with SegmentWriter(path, batch_size=30, segment_rows=50) as writer:
+        for i in range(120):
+            writer.write(make_record("m", "post", sample_account(), str(i)))
+    store = SegmentStore(path)
+    assert sum(store.read_segment(p).num_rows for p in store.segments()) == 120
+    assert all(store.read_segment(p).num_rows <= 50 for p in store.segments())
+
+
+def test_latest_write_wins_across_concurrent_writers(tmp_path):
+    path = str(tmp_path / "posts.segments")
+    first = SegmentWriter(path, segment_rows=10)
+    first.write(make_record("m", "other", sample_account(), "a"))
+    first.flush()
+    second = SegmentWriter(path, segment_rows=10)
+    second.write(make_record("m", "old", sample_account(), "x"))
+    second.flush()
+    # Written last, but to the segment that sorts first
+    first.write(make_record("m", "new", sample_account(), "x"))
+    first.close()
+    second.close()
+
+    store = SegmentStore(path)
+    posts = {record["id"]: record["posts"] for record in store.values()}
+    assert posts == {"a": "other", "x": "new"}
+    assert store.read_table(latest=False).num_rows == 3
+    assert store.read_table(["posts"])["posts"].to_pylist() == ["other", "new"]
+
+
+def test_chunks_without_repeats_are_not_filtered(tmp_path):
+    path = str(tmp_path / "posts.segments")
+    with SegmentWriter(path, batch_size=10, segment_rows=25) as writer:
+        for i in range(60):
+            writer.write(make_record("m", "post", sample_account(), str(i)))
+    store = SegmentStore(path)
+    assert store._latest_masks(store.segments()) is None
+    sizes = [chunk.num_rows for chunk in store.chunks(chunk_size=20)]
+    assert sizes == [20, 5, 20, 5, 10]
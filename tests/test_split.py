@@ -0,0 +1,36 @@
+import pyarrow as pa
+import pytest
+
+from bench import synthetic_responses
+from generate_posts import split_posts, split_posts_arrow
+
+EDGE_CASES = [
+    "",
+    "\n\n",
+    "one post",
+    "Here are some posts:\n\nfirst\n\nsecond\n",
+    "a\n\n---\n\n-\n\nb",
+    "  padded  \n\n\n\n\n\n  gaps  ",
+    "line one\nline two\n\nnext",
+    "tabs\t\n\n\tand spaces  ",
+    "emoji 🎉\n\nunicode é ü",
+    "--- not only dashes\n\n- list item",
+]
+
+
+def arrow_split(texts: list) -> list:
+    parents, posts = split_posts_arrow(pa.array(texts, pa.string()))
+    out = [[] for _ in texts]
+    for parent, post in zip(parents.to_pylist(), posts.to_pylist()):
+        out[parent].append(post)
+    return out
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_split_posts_arrow_edge_cases(text):
+    assert arrow_split([text]) == [split_posts(text)]
+
+
+def test_split_posts_arrow_matches_split_posts():
+    texts = [r["posts"] for r in synthetic_responses(500)] + EDGE_CASES
+    assert arrow_split(texts) == [split_posts(text) for text in texts]
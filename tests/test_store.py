@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from generate_posts import make_record, sample_account
+from store import PostWriter, open_reader
+
+
+class FlakyWriter(PostWriter):
+    """Fails its first ``fail_flushes`` flushes, like a locked database."""
+
+    fail_flushes = 1
+
+    def _write_records(self, records: list):
+        if self.fail_flushes:
+            self.fail_flushes -= 1
+            raise OSError("database is locked")
+        super()._write_records(records)
+
+
+def test_background_flush_error_is_raised_and_nothing_is_lost(tmp_path):
+    path = str(tmp_path / "posts.db")
+    writer = FlakyWriter(path, batch_size=2, flush_interval=0.01)
+    for i in range(2):
+        writer.write(make_record("m", "post", sample_account(), str(i)))
+    deadline = time.monotonic() + 5
+    while writer._error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(OSError, match="locked"):
+        writer.write(make_record("m", "post", sample_account(), "2"))
+    # The failed batch was kept and goes out with the final flush
+    writer.close()
+    db = open_reader(path)
+    assert sorted(db.keys()) == ["0", "1"]
+    db.close()
+
+
+def test_close_raises_when_the_last_flush_fails(tmp_path):
+    writer = FlakyWriter(str(tmp_path / "posts.db"), flush_interval=60)
+    writer.write(make_record("m", "post", sample_account(), "0"))
+    with pytest.raises(OSError, match="locked"):
+        writer.close()
+
+
+def test_free_running_jobs_resume_then_sampling_continues(tmp_path):
+    from generate_posts import _open_jobs
+
+    db_path = str(tmp_path / "posts.db")
+    manifest, jobs = _open_jobs(None, False, db_path)
+    # Pulled and sent, but the process died before any response was stored
+    lost = [next(jobs)[0] for _ in range(3)]
+    manifest.close()
+
+    manifest, jobs = _open_jobs(None, True, db_path)
+    resumed = [next(jobs) for _ in range(4)]
+    assert [job.id for job, _ in resumed[:3]] == [job.id for job in lost]
+    # Then back to sampling, with the prompt built from the catalog
+    job, system_prompt = resumed[3]
+    assert job.id not in {job.id for job in lost}
+    assert system_prompt
+    manifest.close()
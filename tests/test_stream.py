@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+from generate_posts import stream_completion
+from metrics import StreamMetrics
+
+POSTS = ["first post", "second post", "third post", "fourth post"]
+
+
+class FakeStream:
+    def __init__(self, deltas: list, usage=None):
+        self.chunks = [
+            SimpleNamespace(
+                usage=None,
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=d))],
+            )
+            for d in deltas
+        ]
+        if usage:
+            self.chunks.append(SimpleNamespace(usage=usage, choices=[]))
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+def fake_client(stream: FakeStream):
+    async def create(**_):
+        return stream
+
+    return SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+
+
+def deltas() -> list:
+    return [post + "\n\n" for post in POSTS]
+
+
+def test_usage_is_kept_when_reported():
+    usage = SimpleNamespace(prompt_tokens=50, completion_tokens=40)
+    stream = FakeStream(deltas(), usage)
+    text, stats = asyncio.run(stream_completion(fake_client(stream), {}))
+    assert text == "".join(deltas())
+    assert (stats.prompt_tokens, stats.tokens) == (50, 40)
+    assert stats.posts == 4
+
+
+def test_no_usage_when_stopped_early():
+    usage = SimpleNamespace(prompt_tokens=50, completion_tokens=40)
+    stream = FakeStream(deltas(), usage)
+    text, stats = asyncio.run(stream_completion(fake_client(stream), {}, max_posts=2))
+    assert stream.closed
+    assert text == "first post\n\nsecond post"
+    assert stats.stopped_early
+    assert stats.tokens is None
+    assert stats.prompt_tokens is None
+
+    metrics = StreamMetrics()
+    metrics.record("m", stats)
+    assert metrics.summary()["m"]["tokens_per_second"] == 0.0
@@ -0,0 +1,151 @@
+import contextlib
+import io
+
+import pytest
+
+from generate_posts import (
+    _open_jobs,
+    make_failure,
+    make_record,
+    new_job,
+    sample_account,
+)
+from store import JobManifest, manifest_path, open_store, open_writer
+from workers import WorkQueue, merge_shards, run_worker, shard_path
+
+
+def queue_jobs(path, n: int) -> list:
+    jobs = [new_job(sample_account()) for _ in range(n)]
+    queue = WorkQueue(str(path))
+    queue.put(jobs)
+    queue.close()
+    return jobs
+
+
+def test_crashed_worker_resumes_its_whole_claim(tmp_path):
+    queue_path = tmp_path / "queue.db"
+    jobs = queue_jobs(queue_path, 100)
+    shard = shard_path(str(tmp_path), "w0")
+
+    # Pull 5 jobs of a 32-job claim, store them, then die
+    queue = WorkQueue(str(queue_path))
+    manifest = JobManifest(manifest_path(shard))
+    pulled = queue.iter_jobs("w0", 32, manifest)
+    with open_writer(shard) as writer:
+        for _ in range(5):
+            job = next(pulled)
+            writer.write({"id": job.id, "model": "m", "posts": "", "account": {}})
+    manifest.close()
+    queue.close()
+
+    # The restarted worker finds the other 27 in its manifest...
+    manifest = JobManifest(manifest_path(shard))
+    pending = manifest.pending(shard)
+    assert len(pending) == 27
+    # ...and claims the 68 nobody has touched
+    queue = WorkQueue(str(queue_path))
+    rest = list(queue.iter_jobs("w0", 32, manifest))
+    manifest.close()
+    assert len(rest) == 68
+    done = {job.id for job in pending + rest}
+    assert len(done) == 95
+    assert done | {job.id for job in jobs[:5]} == {job.id for job in jobs}
+    queue.close()
+
+
+def test_queue_jobs_are_recorded_once_through_the_callers_manifest(tmp_path):
+    queue_path = tmp_path / "queue.db"
+    jobs = queue_jobs(queue_path, 10)
+    shard = shard_path(str(tmp_path), "w0")
+    manifest = JobManifest(manifest_path(shard))
+    added = []
+    add = manifest.add
+    manifest.add = lambda jobs, commit=True: (added.extend(jobs), add(jobs, commit))
+
+    queue = WorkQueue(str(queue_path))
+    pulled = queue.iter_jobs("w0", 4, manifest)
+    opened, run = _open_jobs(pulled, True, shard, manifest)
+    assert opened is manifest
+    assert [job.id for job, _ in run] == [job.id for job in jobs]
+    assert [job.id for job in added] == [job.id for job in jobs]
+    assert manifest.summary()["planned"] == 10
+    manifest.close()
+    queue.close()
+
+
+def test_stale_claims_are_reclaimed(tmp_path):
+    queue_path = tmp_path / "queue.db"
+    queue_jobs(queue_path, 10)
+    queue = WorkQueue(str(queue_path))
+    assert len(queue.claim("dead", 10)) == 10
+    assert queue.claim("alive", 10) == []
+    assert queue.claim("alive", 10, stale_after=3600) == []
+    assert len(queue.claim("alive", 10, stale_after=0)) == 10
+    queue.complete([row[0] for row in queue.conn.execute("SELECT id FROM queue")])
+    assert queue.claim("other", 10, stale_after=0) == []
+    assert queue.summary() == {"queued": 0, "claimed": 10, "done": 10}
+    queue.close()
+
+
+def test_live_workers_finished_jobs_are_not_reclaimed(tmp_path):
+    queue_path = tmp_path / "queue.db"
+    jobs = queue_jobs(queue_path, 6)
+    queue = WorkQueue(str(queue_path))
+    stored = set()
+    pulled = queue.iter_jobs("w0", 2, finished=lambda ids: stored & set(ids))
+    for _ in range(2):
+        stored.add(next(pulled).id)
+    # The next claim marks the stored ones done first
+    next(pulled)
+
+    other = WorkQueue(str(queue_path))
+    reclaimed = [job.id for job in other.claim("w1", 6, stale_after=0)]
+    # Unclaimed work first, then w0's unfinished claim; never its stored jobs
+    assert reclaimed == [job.id for job in jobs[4:] + jobs[2:4]]
+    other.close()
+    queue.close()
+
+
+def test_worker_end_to_end_with_resume(tmp_path):
+    # ClientPool talks to the mock over httpx
+    pytest.importorskip("httpx")
+    from mock_server import MockConfig, MockServer
+
+    queue_path = str(tmp_path / "queue.db")
+    jobs = queue_jobs(queue_path, 40)
+    shards = str(tmp_path / "shards")
+    with MockServer(MockConfig(seed=0, ttft=0.001)) as server:
+        options = {
+            "configs": server.configs(),
+            "report_every": 0,
+            "max_in_flight": 1,
+            "per_endpoint_limit": 1,
+        }
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_worker(
+                "w0", queue_path, shards, claim_size=16, num_requests=3, **options
+            )
+            run_worker("w0", queue_path, shards, claim_size=16, **options)
+    stats = merge_shards([shard_path(shards, "w0")], str(tmp_path / "posts.db"))
+    assert stats == {"merged": 40, "duplicates": 0, "failures": 0}
+    queue = WorkQueue(queue_path)
+    assert queue.summary()["done"] == len(jobs)
+    queue.close()
+
+
+def test_merge_keeps_failures(tmp_path):
+    retried, lost = new_job(sample_account()), new_job(sample_account())
+    shards = [shard_path(str(tmp_path), name) for name in ("w0", "w1")]
+    with open_writer(shards[0]) as writer:
+        writer.write(make_record("m", "post", sample_account()))
+        writer.write_failure(make_failure(retried, "m", TimeoutError(), 4))
+        writer.write_failure(make_failure(lost, "m", TimeoutError(), 4))
+    with open_writer(shards[1]) as writer:
+        writer.write(make_record("m", "post", retried.account, retried.id))
+
+    db_path = str(tmp_path / "posts.db")
+    stats = merge_shards(shards, db_path)
+    assert stats == {"merged": 2, "duplicates": 0, "failures": 1}
+    failures = open_store(db_path, flag="r", tablename="failures")
+    assert list(failures.keys()) == [lost.id]
+    failures.close()
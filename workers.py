@@ -0,0 +1,362 @@
+"""Coordinator / worker mode for spreading generation over processes or hosts.
+
+The coordinator puts Jobs in a SQLite work queue (any shared filesystem
+works, no external service). Each worker claims jobs in small batches and
+runs them through generate_posts_async() into its own shard, e.g.
+``shards/worker-0.db``. Each claimed batch is written to that shard's job
+manifest before any of it runs, so a crashed worker restarted with the same
+id and ``resume=True`` finishes every job it claimed. Jobs the shard has
+stored are marked done before each new claim. Claims older than
+``stale_after`` seconds that were never completed (a worker that died for
+good) can be taken over by another worker; a job can then run twice, which
+``merge_shards()`` absorbs when it combines the shards into one posts.db,
+deduplicating by record id, ready for format_data_set().
+
+    python workers.py --workers 8 --jobs 10000      # coordinator + local workers
+    python workers.py --worker host2-0 --queue /shared/queue.db   # one worker
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+from generate_posts import Job, new_job
+
+
+class WorkQueue:
+    def __init__(self, path: str = "queue.db", timeout: float = 30.0):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS queue (
+                id TEXT PRIMARY KEY,
+                account TEXT NOT NULL,
+                config_key TEXT,
+                worker TEXT,
+                claimed REAL,
+                done INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(queue)")]
+        if "done" not in columns:
+            self.conn.execute(
+                "ALTER TABLE queue ADD COLUMN done INTEGER NOT NULL DEFAULT 0"
+            )
+
+    def put(self, jobs):
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO queue (id, account, config_key) VALUES (?, ?, ?)",
+            ((job.id, json.dumps(job.account), job.config_key) for job in jobs),
+        )
+        self.conn.execute("COMMIT")
+
+    def claim(self, worker: str, n: int, stale_after: float | None = None) -> list:
+        """Atomically take up to n unclaimed jobs for a worker.
+
+        With ``stale_after``, jobs another worker claimed more than that many
+        seconds ago and never completed are up for grabs too, after the
+        unclaimed ones. Claiming also refreshes the time on the worker's own
+        unfinished claims, so a worker that is still claiming keeps them.
+        """
+        now = time.time()
+        stale = now - stale_after if stale_after is not None else None
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE queue SET claimed = ? WHERE worker = ? AND done = 0",
+                (now, worker),
+            )
+            rows = self.conn.execute(
+                "SELECT id, account, config_key FROM queue "
+                "WHERE done = 0 AND (worker IS NULL OR (worker != ? AND claimed < ?)) "
+                "ORDER BY worker IS NOT NULL, rowid LIMIT ?",
+                (worker, stale, n),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE queue SET worker = ?, claimed = ? WHERE id = ?",
+                ((worker, now, row[0]) for row in rows),
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [Job(json.loads(account), key, id) for id, account, key in rows]
+
+    def complete(self, ids):
+        """Mark jobs finished so they are never reclaimed."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany(
+            "UPDATE queue SET done = 1 WHERE id = ?", ((id,) for id in ids)
+        )
+        self.conn.execute("COMMIT")
+
+    def iter_jobs(
+        self,
+        worker: str,
+        claim_size: int = 32,
+        manifest=None,
+        stale_after: float | None = None,
+        finished=None,
+    ):
+        """Claim and yield jobs until the queue is empty.
+
+        Each claimed batch goes into ``manifest`` (a JobManifest) before the
+        first of its jobs is yielded, so none are lost if the worker dies
+        part way through a batch. ``finished`` (ids -> the ones now stored,
+        e.g. stored_ids()) is asked before every claim, and those jobs are
+        marked done so no other worker reclaims them.
+        """
+        open_ids = []
+        while True:
+            if finished is not None and open_ids:
+                done = set(finished(open_ids))
+                self.complete(done)
+                open_ids = [id for id in open_ids if id not in done]
+            jobs = self.claim(worker, claim_size, stale_after)
+            if not jobs:
+                return
+            if manifest is not None:
+                manifest.add(jobs)
+            open_ids.extend(job.id for job in jobs)
+            yield from jobs
+
+    def summary(self) -> dict:
+        total, claimed, done = self.conn.execute(
+            "SELECT COUNT(*), COUNT(worker), SUM(done) FROM queue"
+        ).fetchone()
+        return {"queued": total - claimed, "claimed": claimed, "done": done or 0}
+
+    def close(self):
+        self.conn.close()
+
+
+def shard_path(shard_dir: str, worker: str) -> str:
+    return os.path.join(shard_dir, f"{worker}.db")
+
+
+def run_worker(
+    worker: str,
+    queue_path: str = "queue.db",
+    shard_dir: str = "shards",
+    claim_size: int = 32,
+    resume: bool = True,
+    stale_after: float | None = None,
+    **kwargs,
+):
+    """Drain the queue into this worker's shard with generate_posts_async(),
+    then mark what landed in the shard as done in the queue."""
+    from generate_posts import generate_posts_async
+    from store import JobManifest, manifest_path
+
+    os.makedirs(shard_dir, exist_ok=True)
+    path = shard_path(shard_dir, worker)
+    queue = WorkQueue(queue_path)
+    manifest = JobManifest(manifest_path(path))
+    jobs = queue.iter_jobs(
+        worker,
+        claim_size,
+        manifest,
+        stale_after,
+        finished=lambda ids: stored_ids(path, ids),
+    )
+    try:
+        asyncio.run(
+            generate_posts_async(
+                db_path=path,
+                jobs=jobs,
+                resume=resume,
+                manifest=manifest,
+                **kwargs,
+            )
+        )
+    finally:
+        manifest.close()
+        if os.path.exists(path):
+            queue.complete(shard_ids(path))
+        queue.close()
+
+
+def stored_ids(path: str, ids: list) -> list:
+    """Which of ``ids`` a shard already has a response or a final failure for."""
+    if not os.path.exists(path):
+        return []
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        tables = [
+            name
+            for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table'"
+            )
+        ]
+        found = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i : i + 500]
+            marks = ", ".join("?" * len(chunk))
+            for table in tables:
+                found.extend(
+                    key
+                    for (key,) in conn.execute(
+                        f'SELECT key FROM "{table}" WHERE key IN ({marks})', chunk
+                    )
+                )
+        return found
+    finally:
+        conn.close()
+
+
+def shard_ids(path: str) -> list:
+    """Ids of the jobs a shard has a response or a final failure for."""
+    from sqlitedict import SqliteDict
+
+    from store import open_store
+
+    ids = []
+    for tablename in SqliteDict.get_tablenames(path):
+        table = open_store(path, flag="r", tablename=tablename)
+        ids.extend(table.keys())
+        table.close()
+    return ids
+
+
+def merge_shards(shard_paths: list, db_path: str = "posts.db") -> dict:
+    """Combine worker shards into one store, keeping one record per id.
+
+    Each shard's ``failures`` table is merged too, minus requests that some
+    shard did complete (e.g. a worker that reclaimed a stale claim). Shards
+    are streamed through StoreReader, so only the ids are held in memory.
+    """
+    from store import StoreReader, open_store
+
+    out = open_store(db_path)
+    seen = set(out.keys())
+    merged = duplicates = 0
+    for path in shard_paths:
+        shard = StoreReader(path)
+        try:
+            for key, record in shard.items():
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                out[key] = record
+                merged += 1
+        finally:
+            shard.close()
+        out.commit()
+    out.close()
+
+    # Only once every shard's responses are known
+    failures = open_store(db_path, tablename="failures")
+    seen.update(failures.keys())
+    new_failures = 0
+    for path in shard_paths:
+        shard = StoreReader(path, tablename="failures")
+        try:
+            if "failures" not in shard.tablenames():
+                continue
+            for key, record in shard.items():
+                if key not in seen:
+                    seen.add(key)
+                    failures[key] = record
+                    new_failures += 1
+        finally:
+            shard.close()
+        failures.commit()
+    failures.close()
+    return {
+        "merged": merged,
+        "duplicates": duplicates,
+        "failures": new_failures,
+    }
+
+
+def run_workers(
+    n_workers: int,
+    jobs=None,
+    n_jobs: int = 0,
+    queue_path: str = "queue.db",
+    shard_dir: str = "shards",
+    db_path: str = "posts.db",
+    seed: int | None = None,
+    **worker_options,
+) -> dict:
+    """Queue ``jobs`` (or ``n_jobs`` accounts sampled with ``seed``), run
+    ``n_workers`` local worker processes against the queue and merge their
+    shards into ``db_path``."""
+    from multiprocessing import get_context
+
+    from catalog import sample_accounts
+
+    if jobs is None:
+        jobs = [new_job(account) for account in sample_accounts(n_jobs, seed)]
+    queue = WorkQueue(queue_path)
+    queue.put(jobs)
+    queue.close()
+
+    ct = time.time()
+    ctx = get_context("spawn")
+    workers = [f"worker-{i}" for i in range(n_workers)]
+    processes = [
+        ctx.Process(
+            target=run_worker,
+            args=(worker, queue_path, shard_dir),
+            kwargs=worker_options,
+        )
+        for worker in workers
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    elapsed = time.time() - ct
+
+    shards = [shard_path(shard_dir, w) for w in workers]
+    stats = merge_shards([s for s in shards if os.path.exists(s)], db_path)
+    stats["seconds"] = round(elapsed, 2)
+    stats["requests_per_second"] = round(stats["merged"] / elapsed, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--jobs", type=int, default=0)
+    parser.add_argument("--worker", help="run a single worker with this id")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--queue", default="queue.db")
+    parser.add_argument("--shards", default="shards")
+    parser.add_argument("--db", default="posts.db")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--stale-after", type=float, help="take over claims older than this (s)"
+    )
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(
+            args.worker,
+            args.queue,
+            args.shards,
+            stale_after=args.stale_after,
+            max_in_flight=args.max_in_flight,
+            report_every=0,
+        )
+        raise SystemExit
+    print(
+        run_workers(
+            args.workers,
+            n_jobs=args.jobs,
+            queue_path=args.queue,
+            shard_dir=args.shards,
+            db_path=args.db,
+            seed=args.seed,
+            stale_after=args.stale_after,
+            max_in_flight=args.max_in_flight,
+            report_every=0,
+        )
+    )